@@ -1,10 +1,31 @@
+// last responses (with ETag) of GET requests, revalidated using `If-None-Match`.
+const responseCache = new Map()
+const RESPONSE_CACHE_SIZE = 50
+
 async function get(url, params) {
-    if (params == undefined) {
-        return await fetch(url)
-    } else {
+    if (params != undefined) {
         const qs = new URLSearchParams(params)
-        return await fetch(url + '?' + qs)
+        url = url + '?' + qs
+    }
+
+    const cached = responseCache.get(url)
+    const headers = cached ? { "If-None-Match": cached.etag } : {}
+    const resp = await fetch(url, { headers: headers })
+    if (resp.status === 304 && cached) {
+        return new Response(cached.body, { status: 200, headers: { "Content-Type": "application/json" } })
+    }
+
+    const etag = resp.headers.get('ETag')
+    if (resp.ok && etag) {
+        const body = await resp.clone().text()
+        // Map keeps insertion order, drop the oldest one.
+        responseCache.delete(url)
+        if (responseCache.size >= RESPONSE_CACHE_SIZE) {
+            responseCache.delete(responseCache.keys().next().value)
+        }
+        responseCache.set(url, { etag: etag, body: body })
     }
+    return resp
 }
 
 async function del(url) {
@@ -33,6 +54,15 @@ async function put(url, data) {
     })
 }
 
+// discussion: topic, first page of threads and subscription for a project.
+export async function getDiscussionBootstrap(projectId) {
+    const resp = await get('/forum/api/v1/utils/bootstrap_for_project/', { project: projectId })
+    return {
+        ok: resp.ok,
+        data: await resp.json()
+    }
+}
+
 // topics
 export async function getTopicForProject(projectId) {
     const resp = await get('/forum/api/v1/utils/get_topic_for_project/', { project: projectId })
@@ -74,6 +104,14 @@ export async function getThread(threadId) {
     }
 }
 
+// counts a view of the thread and marks it read, the response has no body.
+export async function viewThread(threadId) {
+    const resp = await post(`/forum/api/v1/threads/${threadId}/view/`, {})
+    return {
+        ok: resp.ok,
+    }
+}
+
 export async function listReply(filter, next_url) {
     let resp;
     if (next_url) {
@@ -133,4 +171,27 @@ export async function deleteThread(threadId) {
     return {
         ok: resp.ok
     }
-}
\ No newline at end of file
+}
+
+// realtime
+// `stream`: `topics/<id>` or `threads/<id>`, `handlers`: event type => function(event).
+// returns a function to close the stream.
+export function subscribe(stream, handlers) {
+    if (typeof EventSource === 'undefined') {
+        return () => { }
+    }
+
+    const source = new EventSource(`/forum/stream/${stream}/`)
+    let opened = false
+    source.onopen = () => {
+        // reconnected: events sent while disconnected are lost.
+        if (opened && handlers.resync) {
+            handlers.resync()
+        }
+        opened = true
+    }
+    for (const [type, handler] of Object.entries(handlers)) {
+        source.addEventListener(type, (e) => handler(JSON.parse(e.data)))
+    }
+    return () => source.close()
+}
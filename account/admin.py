@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
 
+from .gifting import gift_purchases
 from .models import (
     User,
     Link,
@@ -35,10 +36,7 @@ class ProAccessPurchaseAdmin(admin.ModelAdmin):
 
     def set_gifted(self, request, queryset):
         if request.user.is_superuser:
-            count = 0
-            for purchase in queryset:
-                purchase.set_gifted()
-                count += 1
+            count = gift_purchases(queryset)
             self.message_user(
                 request, f'{count} purchase(s) marked as gifted.')
     set_gifted.short_description = 'Berikan Pro Access gratis'
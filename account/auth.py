@@ -0,0 +1,102 @@
+"""
+`request.user` loading, see `CachedAuthenticationMiddleware`.
+
+The user is fetched together with its one-to-one relations (`link`, `pro_access`)
+in a single query and kept in the cache for a few seconds, keyed by session.
+Saving the user or its relations bumps the user's version, which discards the
+cached copies of every session (see `account.signals`).
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    _get_user_session_key,
+    load_backend,
+)
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import constant_time_compare
+
+CACHE_KEY = 'auth_user:{}'
+VERSION_KEY = 'auth_user:version:{}'
+CACHE_TIMEOUT = 10
+RELATED = ('link', 'pro_access')
+
+
+def _load(user_id):
+    # to avoid circular dependency
+    from .models import User
+
+    return User.objects.select_related(*RELATED).filter(pk=user_id).first()
+
+
+def _is_session_valid(request, user):
+    """
+    Same checks as `django.contrib.auth.get_user()`.
+    """
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash:
+        return False
+    if constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return True
+    legacy_hash = getattr(user, '_legacy_get_session_auth_hash', None)
+    return legacy_hash is not None and constant_time_compare(session_hash, legacy_hash())
+
+
+def get_user(request):
+    """
+    Returns the user of the current session, or `AnonymousUser`.
+    """
+    try:
+        user_id = _get_user_session_key(request)
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    # hashed, signed cookie sessions use the whole cookie as session key.
+    session_key = request.session.session_key or ''
+    key = CACHE_KEY.format(hashlib.sha256(session_key.encode()).hexdigest())
+    version_key = VERSION_KEY.format(user_id)
+    cached = cache.get_many([key, version_key])
+    version = cached.get(version_key, 0)
+    user = None
+    if key in cached:
+        cached_user_id, cached_version, cached_user = cached[key]
+        if cached_user_id == user_id and cached_version == version:
+            user = cached_user
+
+    if user is None:
+        user = _load(user_id)
+        if user is None:
+            return AnonymousUser()
+        cache.set(key, (user_id, version, user), CACHE_TIMEOUT)
+
+    backend = load_backend(backend_path)
+    can_authenticate = getattr(backend, 'user_can_authenticate', None)
+    if can_authenticate is not None and not can_authenticate(user):
+        return AnonymousUser()
+    if not _is_session_valid(request, user):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+def _bump_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def invalidate_user(user_id):
+    _bump_version(user_id)
+    # again once committed, a request could cache the old row in between.
+    transaction.on_commit(lambda: _bump_version(user_id))
@@ -0,0 +1,77 @@
+"""
+Entitlement snapshot: what a user's plan allows, as plain attributes.
+
+Loaded once per user instance (`user.entitlement`, so once per request for
+`request.user`, see `EntitlementMiddleware`) from the `pro_access` already
+selected with the user, or from the cache, or with a single query.
+Cached values are invalidated whenever `ProAccess` is saved
+(eg. `extend_days()`, `shorten_days()`).
+"""
+import math
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+
+CACHE_KEY = 'entitlement:{}'
+CACHE_TIMEOUT = 60 * 60
+# runs of a codeblock free users get every 24 hours, see `UserProject.can_run_codeblock()`
+FREE_CODE_RUN_LIMIT = 10
+
+_missing = object()
+
+
+@dataclass(frozen=True)
+class Entitlement:
+    is_pro: bool
+    # end of pro access, `None` when never had one.
+    pro_end: Optional[datetime]
+    # remaining pro access, in days (started days count).
+    remaining_days: int
+    # codeblock runs allowed every 24 hours, `None` when unlimited.
+    code_run_limit: Optional[int]
+
+    @staticmethod
+    def from_pro_end(pro_end):
+        rightnow = now()
+        is_pro = pro_end is not None and pro_end > rightnow
+        return Entitlement(
+            is_pro=is_pro,
+            pro_end=pro_end,
+            remaining_days=math.ceil((pro_end - rightnow).total_seconds() / 86400) if is_pro else 0,
+            code_run_limit=None if is_pro else FREE_CODE_RUN_LIMIT,
+        )
+
+
+def get_entitlement(user):
+    """
+    Returns `Entitlement` of `user`, anonymous users get the free one.
+    """
+    # to avoid circular dependency
+    from .models import ProAccess, User
+
+    if not user.is_authenticated:
+        return Entitlement.from_pro_end(None)
+
+    # pro_access selected along with the user, nothing to load.
+    if User.pro_access.is_cached(user):
+        pro_access = getattr(user, 'pro_access', None)
+        return Entitlement.from_pro_end(pro_access.end if pro_access else None)
+
+    key = CACHE_KEY.format(user.pk)
+    pro_end = cache.get(key, _missing)
+    if pro_end is _missing:
+        pro_end = ProAccess.objects.filter(user_id=user.pk) \
+            .values_list('end', flat=True).first()
+        cache.set(key, pro_end, CACHE_TIMEOUT)
+    return Entitlement.from_pro_end(pro_end)
+
+
+def invalidate_entitlement(user_id):
+    key = CACHE_KEY.format(user_id)
+    cache.delete(key)
+    # again once committed, a request could cache the old value in between.
+    transaction.on_commit(lambda: cache.delete(key))
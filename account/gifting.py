@@ -0,0 +1,153 @@
+"""
+Pro access granted in bulk (eg. a classroom, a promo list), without
+going through `ProAccess.extend_days()` one user at a time.
+
+Every chunk of users is handled with a few set-based queries:
+    - missing `ProAccess` rows are inserted (`ON CONFLICT DO NOTHING`),
+    - gifted `ProAccessPurchase` rows are added with `bulk_create()`,
+    - `end` dates are extended with one UPDATE per distinct number of days.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.timezone import now
+
+from .auth import invalidate_user
+from .entitlements import invalidate_entitlement
+from .models import ProAccess, ProAccessPurchase
+
+CHUNK_SIZE = 1000
+GIFT_PLAN_NAME = 'Gift'
+
+
+@dataclass
+class GrantSummary:
+    # users granted access
+    users: int = 0
+    # users who had no pro access row yet
+    created: int = 0
+    # users whose access was still running, thus extended from its end
+    extended: int = 0
+    # users whose access was never started or already ended, thus starting now
+    started: int = 0
+    purchases: int = 0
+    dry_run: bool = False
+
+    def __str__(self):
+        return (
+            f"{'would grant' if self.dry_run else 'granted'} {self.users} user(s): "
+            f'{self.created} new, {self.extended} extended, {self.started} (re)started, '
+            f'{self.purchases} purchase(s)'
+        )
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def extend_days(days_by_user, rightnow=None):
+    """
+    Extend the pro access of users, `{user_id: days}`, like `ProAccess.extend_days()`
+    does: from `end` when still running, from now otherwise.
+    Pro access rows must exist. Must be called within a transaction.
+    """
+    rightnow = rightnow or now()
+    users_by_days = defaultdict(list)
+    for user_id, days in days_by_user.items():
+        users_by_days[days].append(user_id)
+
+    for days, user_ids in users_by_days.items():
+        ProAccess.objects.filter(user_id__in=user_ids).update(
+            start=Coalesce('start', models.Value(rightnow)),
+            end=models.ExpressionWrapper(
+                Greatest(Coalesce('end', models.Value(rightnow)), models.Value(rightnow))
+                + models.Value(timedelta(days=days)),
+                output_field=models.DateTimeField()),
+            updated=rightnow,
+        )
+
+    # update() skips `ProAccess.save()` and signals.
+    for user_id in days_by_user:
+        invalidate_entitlement(user_id)
+        invalidate_user(user_id)
+
+
+def _summarize(summary, user_ids, rightnow):
+    ends = ProAccess.objects.filter(user_id__in=user_ids).values_list('end', flat=True)
+    running = sum(1 for end in ends if end is not None and end > rightnow)
+    summary.users += len(user_ids)
+    summary.created += len(user_ids) - len(ends)
+    summary.extended += running
+    summary.started += len(user_ids) - running
+
+
+def grant_pro_access(user_ids, days, plan_name=GIFT_PLAN_NAME, dry_run=False,
+                     chunk_size=CHUNK_SIZE):
+    """
+    Give `days` of pro access to every user of `user_ids`, recorded as gifted
+    purchases of `plan_name`. Each chunk of `chunk_size` users is granted in
+    its own transaction. Returns a `GrantSummary` (of what would be done when
+    `dry_run`).
+    """
+    summary = GrantSummary(dry_run=dry_run)
+    user_ids = sorted(set(user_ids))
+    for chunk in _chunks(user_ids, chunk_size):
+        rightnow = now()
+        _summarize(summary, chunk, rightnow)
+        summary.purchases += len(chunk)
+        if dry_run:
+            continue
+
+        with transaction.atomic():
+            ProAccess.objects.bulk_create(
+                [ProAccess(user_id=user_id) for user_id in chunk], ignore_conflicts=True)
+            pro_access_ids = dict(
+                ProAccess.objects.filter(user_id__in=chunk).values_list('user_id', 'pk'))
+            ProAccessPurchase.objects.bulk_create([
+                ProAccessPurchase(
+                    user_id=user_id,
+                    pro_access_id=pro_access_ids[user_id],
+                    plan_name=plan_name,
+                    days=days,
+                    price=0,
+                    status=ProAccessPurchase.STATUS_ORDER_GIFTED,
+                )
+                for user_id in chunk
+            ])
+            extend_days({user_id: days for user_id in chunk}, rightnow)
+    return summary
+
+
+def gift_purchases(purchases, chunk_size=CHUNK_SIZE):
+    """
+    Mark `purchases` (a queryset) as gifted and extend the access of their
+    users by their days. Already gifted purchases are left alone.
+    Returns the number of purchases gifted.
+    """
+    gifted = 0
+    rows = list(
+        purchases.exclude(status=ProAccessPurchase.STATUS_ORDER_GIFTED)
+        .order_by('pk').values_list('pk', 'user_id', 'days')
+    )
+    for chunk in _chunks(rows, chunk_size):
+        with transaction.atomic():
+            # locked, so concurrent actions can't gift them twice.
+            purchase_ids = set(
+                ProAccessPurchase.objects.select_for_update()
+                .filter(pk__in=[pk for pk, _, _ in chunk])
+                .exclude(status=ProAccessPurchase.STATUS_ORDER_GIFTED)
+                .values_list('pk', flat=True)
+            )
+            days_by_user = defaultdict(int)
+            for pk, user_id, days in chunk:
+                if pk in purchase_ids:
+                    days_by_user[user_id] += days
+            ProAccessPurchase.objects.filter(pk__in=purchase_ids).update(
+                status=ProAccessPurchase.STATUS_ORDER_GIFTED, updated=now())
+            extend_days(days_by_user)
+            gifted += len(purchase_ids)
+    return gifted
@@ -1,51 +1,76 @@
-from django.core.management.base import BaseCommand
-from django.core.paginator import Paginator
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils.dateparse import parse_datetime
 
-from social_django.models import UserSocialAuth
 from account.models import User
 
 
 class Command(BaseCommand):
     help = 'Verify user email address'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be verified without saving')
+        parser.add_argument('--since', default=None,
+                            help='Only users modified since this datetime (ISO 8601)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Users read per fetch and saved per UPDATE')
+
     def handle(self, *args, **options):
-        pages = Paginator(User.objects.all(), per_page=100)
-
-        for p in range(1, pages.num_pages + 1):
-            users = pages.page(p)
-            for user in users:
-                # current email
-                current_email = user.email
-                user_pk = user.pk
-
-                # auths
-                auths = UserSocialAuth.objects.filter(user=user)
-                if len(auths) == 1:
-                    auth = auths[0]
-                    # uid == current email OR uid is not an email <-- mark verified
-                    if ('@' in auth.uid and auth.uid == current_email) or (not '@' in auth.uid):
-                        if current_email != user.verified_email:
-                            self.stdout.write(self.style.WARNING(
-                                f'[{user_pk}] {current_email} {user.verified_email} not verified'))
-                            user.verified_email = current_email
-                            user.save()
-                        pass
-                    else:
-                        self.stdout.write(self.style.ERROR(
-                            f'[{user_pk}] {current_email} not verified'))
-                else:
-                    verified = False
-                    for auth in auths:
-                        if auth.uid == current_email:
-                            if current_email != user.verified_email:
-                                self.stdout.write(self.style.WARNING(
-                                    f'[{user_pk}] {current_email} {user.verified_email} not verified'))
-                                user.verified_email = current_email
-                                user.save()
-                            verified = True
-                            break
-                    if verified:
-                        verified = False
-                    else:
-                        self.stdout.write(self.style.ERROR(
-                            f'[{user_pk}] {current_email} not verified'))
+        users = User.objects.all()
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 datetime, eg. 2021-11-01T00:00:00Z')
+            users = users.filter(date_modified__gte=since)
+
+        # one row per user along with its social auths counts, streamed
+        # from a server-side cursor.
+        rows = users.annotate(
+            auths=Count('social_auth'),
+            email_auths=Count('social_auth', filter=Q(social_auth__uid=F('email'))),
+            non_email_auths=Count('social_auth', filter=~Q(social_auth__uid__contains='@')),
+        ).order_by('pk').values_list(
+            'pk', 'email', 'verified_email', 'auths', 'email_auths', 'non_email_auths'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        started = time.perf_counter()
+        scanned = verified = not_verified = 0
+        pending = []
+        for user_pk, email, verified_email, auths, email_auths, non_email_auths in rows:
+            scanned += 1
+            # uid == current email OR uid of the only auth is not an email <-- mark verified
+            if email_auths or (auths == 1 and non_email_auths):
+                if email != verified_email:
+                    verified += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(self.style.WARNING(
+                            f'[{user_pk}] {email} {verified_email} not verified'))
+                    pending.append(User(pk=user_pk, verified_email=email))
+            else:
+                not_verified += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(self.style.ERROR(f'[{user_pk}] {email} not verified'))
+
+            if len(pending) >= options['chunk_size']:
+                self.save(pending, options['dry_run'])
+                pending = []
+        self.save(pending, options['dry_run'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"[OK] {scanned} user(s) scanned, {verified} "
+            f"{'to verify' if options['dry_run'] else 'verified'}, "
+            f'{not_verified} not verifiable, '
+            f'{scanned / elapsed if elapsed else 0:.0f} rows/s'))
+
+    def save(self, users, dry_run):
+        if dry_run or not users:
+            return
+        # bulk_update() skips signals, cached `request.user` copies
+        # (see `account.auth`) catch up within seconds.
+        with transaction.atomic():
+            User.objects.bulk_update(users, ['verified_email'])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from account.models import ProAccessPurchase
+
+
+class Command(BaseCommand):
+    help = 'Set pending Pro Access orders no longer valid to expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Orders expired per UPDATE')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep expiring every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300,
+                            help='Seconds between runs when --loop is used')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = ProAccessPurchase.expire_pending(chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f'[OK] {expired} order(s) expired'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,77 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from account.gifting import CHUNK_SIZE, GIFT_PLAN_NAME, grant_pro_access
+from account.models import User
+from upkoding import pricing
+
+
+class Command(BaseCommand):
+    help = 'Give Pro Access to many users at once (eg. a classroom or a promo list)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', default=[],
+                            help='Username or email of a user, can be used multiple times')
+        parser.add_argument('--csv', default=None,
+                            help='CSV file with a username or email in its first column '
+                                 '(a header row is skipped)')
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days of access given')
+        parser.add_argument('--plan', default=None,
+                            help='Plan ID, gives the days of this plan instead of --days')
+        parser.add_argument('--plan-name', default=None,
+                            help=f'Plan name of the gifted purchases (default: plan name or "{GIFT_PLAN_NAME}")')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Users granted per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be granted')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        plan_name = options['plan_name'] or GIFT_PLAN_NAME
+        if options['plan']:
+            plan = pricing.get_plan(options['plan'])
+            if plan is None:
+                raise CommandError(f"Unknown plan: {options['plan']}")
+            days = plan.access_days
+            plan_name = options['plan_name'] or plan.name
+        if not days or days < 1:
+            raise CommandError('Use --days or --plan to set the days of access given.')
+
+        identifiers = set(options['user'])
+        if options['csv']:
+            identifiers |= self.read_csv(options['csv'])
+        if not identifiers:
+            raise CommandError('No user given, use --user or --csv.')
+
+        user_ids = set()
+        found = set()
+        for chunk in self.chunks(sorted(identifiers), options['chunk_size']):
+            users = User.objects.filter(Q(username__in=chunk) | Q(email__in=chunk)) \
+                .values_list('pk', 'username', 'email')
+            for user_id, username, email in users:
+                user_ids.add(user_id)
+                found |= {username, email}
+        for identifier in sorted(identifiers - found):
+            self.stdout.write(self.style.WARNING(f'[{identifier}] user not found, skipped'))
+
+        summary = grant_pro_access(
+            user_ids, days, plan_name=plan_name,
+            dry_run=options['dry_run'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'[OK] {days} day(s) of "{plan_name}": {summary}'))
+
+    def read_csv(self, path):
+        identifiers = set()
+        with open(path, newline='') as f:
+            for i, row in enumerate(csv.reader(f)):
+                value = row[0].strip() if row else ''
+                if not value or (i == 0 and value.lower() in ('username', 'email')):
+                    continue
+                identifiers.add(value)
+        return identifiers
+
+    def chunks(self, items, size):
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from account.models import MidtransPaymentNotification
+
+
+class Command(BaseCommand):
+    help = 'Process stored Midtrans payment notifications again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', default=None,
+                            help='Notification to process, can be used multiple times')
+        parser.add_argument('--since', default=None,
+                            help='Only notifications received since this datetime (ISO 8601)')
+        parser.add_argument('--older-than', type=int, default=60,
+                            help='Only notifications received at least this many seconds ago, '
+                                 'so the ones being processed by the webhook are left alone')
+        parser.add_argument('--force', action='store_true',
+                            help='Process already processed notifications too')
+
+    def handle(self, *args, **options):
+        notifications = MidtransPaymentNotification.objects.filter(duplicate=False)
+        if options['id']:
+            notifications = notifications.filter(pk__in=options['id'])
+        else:
+            notifications = notifications.filter(
+                created__lte=now() - timedelta(seconds=options['older_than']))
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 datetime, eg. 2021-11-01T00:00:00Z')
+            notifications = notifications.filter(created__gte=since)
+        if not options['force']:
+            notifications = notifications.filter(processed__isnull=True)
+
+        processed = 0
+        ids = notifications.order_by('created', 'pk').values_list('pk', flat=True)
+        for notification_id in ids:
+            try:
+                if MidtransPaymentNotification.process_by_id(notification_id, force=options['force']):
+                    processed += 1
+                    self.stdout.write(f'[{notification_id}] processed')
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'[{notification_id}] failed: {e}'))
+        self.stdout.write(self.style.SUCCESS(f'[OK] {processed} notification(s) processed'))
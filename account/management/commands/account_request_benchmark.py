@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from account.models import User
+
+SESSION_BACKENDS = ('db', 'cached_db', 'signed_cookies')
+
+
+class Command(BaseCommand):
+    help = 'Measure queries and time per request of pages, for every session backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', action='append', default=None,
+                            help='Page to request, can be used multiple times')
+        parser.add_argument('--user', default=None,
+                            help='Username to request pages as (default: first superuser)')
+        parser.add_argument('--anonymous', action='store_true',
+                            help='Request pages without logging in')
+        parser.add_argument('--runs', type=int, default=20,
+                            help='Number of requests of every page')
+
+    def handle(self, *args, **options):
+        user = None
+        if not options['anonymous']:
+            if options['user']:
+                user = User.objects.filter(username=options['user']).first()
+            else:
+                user = User.objects.filter(is_superuser=True).order_by('pk').first()
+            if user is None:
+                raise CommandError('No user to log in with, use --user or --anonymous.')
+
+        paths = options['path'] or ['/', '/account/', '/forum/api/v1/threads/']
+        self.stdout.write(
+            f"cache: {settings.CACHES['default']['BACKEND']}, "
+            f"{options['runs']} request(s) per page, "
+            f"as {user.username if user else 'anonymous'}")
+
+        for backend in SESSION_BACKENDS:
+            engine = f'django.contrib.sessions.backends.{backend}'
+            with override_settings(SESSION_ENGINE=engine):
+                self.run(backend, user, paths, options['runs'])
+
+    def run(self, backend, user, paths, runs):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        if user is not None:
+            client.force_login(user)
+
+        for path in paths:
+            # warm up, caches filled by the first request are part of the point.
+            status = client.get(path).status_code
+            queries = []
+            timings = []
+            for _ in range(runs):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    client.get(path)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+
+            self.stdout.write(self.style.SUCCESS(
+                f'[OK] {backend:<14} {path} ({status}): '
+                f'{statistics.mean(queries):.1f} queries, '
+                f'p50 {statistics.median(timings):.1f}ms per request'))
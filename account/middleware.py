@@ -2,10 +2,15 @@ import six
 from django.conf import settings
 from django.shortcuts import redirect, reverse
 from django.contrib import messages
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
 
 from social_django.middleware import SocialAuthExceptionMiddleware
 from social_core.exceptions import NotAllowedToDisconnect, SocialAuthBaseException
 
+from .auth import get_user
+from .entitlements import get_entitlement
+
 
 class SocialLoginExceptionMiddleware(SocialAuthExceptionMiddleware):
     """
@@ -31,3 +36,35 @@ class SocialLoginExceptionMiddleware(SocialAuthExceptionMiddleware):
             if request.user.is_authenticated:
                 return redirect(reverse('account:index'))
             return redirect(settings.LOGIN_ERROR_URL)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    Drop-in replacement of Django's `AuthenticationMiddleware`, loads `request.user`
+    with its one-to-one relations in a single query, cached for a few seconds
+    (see `account.auth`).
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+
+
+class EntitlementMiddleware:
+    """
+    Sets `request.entitlement`, entitlement snapshot of `request.user`
+    (see `account.entitlements`), loaded on first access only.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.entitlement = SimpleLazyObject(lambda: self.get_entitlement(request.user))
+        return self.get_response(request)
+
+    def get_entitlement(self, user):
+        if user.is_authenticated:
+            # shared with `user.is_pro_user()` and friends for the rest of the request
+            return user.entitlement
+        return get_entitlement(user)
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:47
+
+from django.db import migrations, models
+from django.db.models import F, Min
+
+
+def dedupe_notifications(apps, schema_editor):
+    """
+    Notifications received so far were processed synchronously,
+    the first one of every retried notification is kept, the others are
+    flagged as duplicates.
+    """
+    MidtransPaymentNotification = apps.get_model('account', 'MidtransPaymentNotification')
+    MidtransPaymentNotification.objects.update(processed=F('updated'))
+    first_ids = MidtransPaymentNotification.objects \
+        .values('transaction_id', 'transaction_status', 'fraud_status') \
+        .annotate(first_id=Min('id')).values_list('first_id', flat=True)
+    MidtransPaymentNotification.objects.exclude(id__in=list(first_ids)).update(duplicate=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_auto_20211111_2109'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='midtranspaymentnotification',
+            name='processed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='midtranspaymentnotification',
+            name='duplicate',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(dedupe_notifications, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='midtranspaymentnotification',
+            constraint=models.UniqueConstraint(condition=models.Q(('duplicate', False), ('fraud_status__isnull', False)), fields=('transaction_id', 'transaction_status', 'fraud_status'), name='midtrans_notification_unique_status_fraud'),
+        ),
+        migrations.AddConstraint(
+            model_name='midtranspaymentnotification',
+            constraint=models.UniqueConstraint(condition=models.Q(('duplicate', False), ('fraud_status__isnull', True)), fields=('transaction_id', 'transaction_status'), name='midtrans_notification_unique_status'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_midtrans_notification_dedupe'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='proaccesspurchase',
+            name='status',
+            field=models.SmallIntegerField(choices=[(0, 'order.pending'), (1, 'order.canceled'), (2, 'order.gifted'), (3, 'order.expired'), (10, 'payment.pending'), (11, 'payment.canceled'), (12, 'payment.paid'), (13, 'payment.expired'), (14, 'payment.refund'), (15, 'payment.failed')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='proaccesspurchase',
+            index=models.Index(fields=['user', 'status', 'valid_until'], name='purchase_user_status_valid_idx'),
+        ),
+    ]
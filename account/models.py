@@ -2,15 +2,17 @@ import uuid
 from datetime import timedelta
 from django.utils.timezone import now
 from django.urls import reverse
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.humanize.templatetags import humanize
+from django.utils.functional import cached_property
 from django.conf import settings
 
 
 from sorl.thumbnail import ImageField, get_thumbnail
 from .managers import UserSettingManager, USER_SETTING_TYPES, USER_SETTING_TYPE_BOOL
+from .entitlements import get_entitlement, invalidate_entitlement
 
 
 def avatar_path(instance, filename):
@@ -51,10 +53,24 @@ class User(AbstractUser):
     def avatar_url(self, size=100):
         """
         If user upload their picture manually, use it. Otherwise generate from default Gravatar image.
+        Resolved URLs are memoized on the instance, so repeated calls don't hit the thumbnail store.
         """
-        if self.avatar:
-            return get_thumbnail(self.avatar, '{}x{}'.format(size, size), crop='center', quality=99).url
-        return 'https://www.gravatar.com/avatar/{}?d=retro&f=y&s={}'.format(self.id, size)
+        size = int(size)
+        avatar_urls = self.__dict__.setdefault('_avatar_urls', {})
+        if size not in avatar_urls:
+            avatar_urls[size] = self.build_avatar_url(self.id, self.avatar, size)
+        return avatar_urls[size]
+
+    @staticmethod
+    def build_avatar_url(user_id, avatar, size=100):
+        """
+        Avatar URL from raw field values (`avatar` can be the stored file name),
+        for callers working with `values()` rows instead of instances.
+        """
+        if avatar:
+            return get_thumbnail(
+                avatar, '{}x{}'.format(size, size), crop='center', quality=99).url
+        return 'https://www.gravatar.com/avatar/{}?d=retro&f=y&s={}'.format(user_id, size)
 
     def get_absolute_url(self):
         return reverse('coders:detail', args=[self.username])
@@ -71,20 +87,33 @@ class User(AbstractUser):
         except ObjectDoesNotExist:
             return None
 
-    def add_point(self, point):
-        self.point = models.F('point') + point
-        self.save()
+    def add_point(self, point, reason='', reference=''):
+        # to avoid circular dependency
+        from coders.models import PointEntry
 
-    def remove_point(self, point):
-        self.point = models.F('point') - point
-        self.save()
+        with transaction.atomic():
+            self.point = models.F('point') + point
+            self.save()
+            PointEntry.record(self.pk, point, reason, reference)
+
+    def remove_point(self, point, reason='', reference=''):
+        # to avoid circular dependency
+        from coders.models import PointEntry
+
+        with transaction.atomic():
+            self.point = models.F('point') - point
+            self.save()
+            PointEntry.record(self.pk, -point, reason, reference)
+
+    @cached_property
+    def entitlement(self):
+        """
+        Entitlement snapshot (see `account.entitlements`), loaded once per instance.
+        """
+        return get_entitlement(self)
 
     def is_pro_user(self):
-        try:
-            pro_access = self.pro_access
-            return pro_access.is_active()
-        except Exception:
-            return False
+        return self.entitlement.is_pro
 
     def is_email_verified(self):
         if not self.email:
@@ -173,6 +202,12 @@ class ProAccess(models.Model):
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_entitlement(self.user_id)
+        if ProAccess.user.is_cached(self):
+            self.user.__dict__.pop('entitlement', None)
+
     def is_active(self):
         return self.end is not None and self.end > now()
 
@@ -217,6 +252,8 @@ class ProAccessPurchase(models.Model):
     STATUS_ORDER_PENDING = 0
     STATUS_ORDER_CANCELED = 1
     STATUS_ORDER_GIFTED = 2
+    # pending orders not paid before `valid_until`, see `expire_pending()`.
+    STATUS_ORDER_EXPIRED = 3
     # 10-19 are status based on payment status received from payment processor.
     STATUS_PAYMENT_PENDING = 10
     STATUS_PAYMENT_CANCELED = 11
@@ -228,6 +265,7 @@ class ProAccessPurchase(models.Model):
         (STATUS_ORDER_PENDING, 'order.pending'),
         (STATUS_ORDER_CANCELED, 'order.canceled'),
         (STATUS_ORDER_GIFTED, 'order.gifted'),
+        (STATUS_ORDER_EXPIRED, 'order.expired'),
         (STATUS_PAYMENT_PENDING, 'payment.pending'),
         (STATUS_PAYMENT_CANCELED, 'payment.canceled'),
         (STATUS_PAYMENT_PAID, 'payment.paid'),
@@ -265,20 +303,28 @@ class ProAccessPurchase(models.Model):
                          name='purchase_valid_until_idx'),
             models.Index(fields=['review_required'],
                          name='purchase_review_required_idx'),
+            models.Index(fields=['user', 'status', 'valid_until'],
+                         name='purchase_user_status_valid_idx'),
         ]
 
+    def is_expired(self):
+        # pending orders are expired by `expire_pending()` periodically,
+        # until then they're expired as soon as they aren't valid anymore.
+        return self.status == self.STATUS_ORDER_EXPIRED or \
+            (self.status == self.STATUS_ORDER_PENDING and self.valid_until <= now())
+
     @property
     def status_label(self):
-        if self.status != self.STATUS_ORDER_PENDING or (self.valid_until > now()):
-            return self.get_status_display()
-        return 'order.expired'
+        if self.is_expired():
+            return 'order.expired'
+        return self.get_status_display()
 
     @property
     def status_color(self):
         """Bootstrap color code"""
+        if self.is_expired():
+            return 'secondary'
         if self.status == self.STATUS_ORDER_PENDING:
-            if self.valid_until < now():
-                return 'secondary'
             return 'warning'
         if self.status == self.STATUS_ORDER_GIFTED:
             return 'primary'
@@ -293,7 +339,7 @@ class ProAccessPurchase(models.Model):
         return 'secondary'
 
     def can_pay(self):
-        return self.status == self.STATUS_ORDER_PENDING and self.valid_until > now()
+        return self.status == self.STATUS_ORDER_PENDING and not self.is_expired()
 
     def is_payment_pending(self):
         return self.status == self.STATUS_PAYMENT_PENDING
@@ -312,14 +358,33 @@ class ProAccessPurchase(models.Model):
         Eligible users:
         - Users who doesn't have pending ProAccessPurchase. 
         """
-        valid_and_pending_purchases = ProAccessPurchase.objects.filter(
+        # EXISTS on the `purchase_user_status_valid_idx` index
+        return not ProAccessPurchase.objects.filter(
             user=user,
             status=ProAccessPurchase.STATUS_ORDER_PENDING,
             valid_until__gte=now()
-        )
-        if len(valid_and_pending_purchases) > 0:
-            return False
-        return True
+        ).exists()
+
+    @staticmethod
+    def expire_pending(chunk_size=1000):
+        """
+        Set pending orders no longer valid to `STATUS_ORDER_EXPIRED`, `chunk_size`
+        orders per UPDATE (and transaction). Returns the number of expired orders.
+        """
+        expired = 0
+        while True:
+            rightnow = now()
+            pending = ProAccessPurchase.objects.filter(
+                status=ProAccessPurchase.STATUS_ORDER_PENDING,
+                valid_until__lt=rightnow)
+            ids = list(pending.order_by('valid_until').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return expired
+            # still pending, a payment could have been made meanwhile.
+            expired += pending.filter(pk__in=ids).update(
+                status=ProAccessPurchase.STATUS_ORDER_EXPIRED, updated=rightnow)
+            if len(ids) < chunk_size:
+                return expired
 
     def set_canceled(self):
         self.status = self.STATUS_ORDER_CANCELED
@@ -351,9 +416,27 @@ class MidtransPaymentNotification(models.Model):
     fraud_status = models.CharField(max_length=50, blank=True, null=True)
     status_code = models.IntegerField()
     gross_amount = models.FloatField()
+    # when applied to the purchase, see `process_by_id()`.
+    processed = models.DateTimeField(blank=True, null=True)
+    # a retry stored before retries were deduplicated, kept as history only.
+    duplicate = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # a notification is sent once per transaction status (and fraud status,
+            # eg. a challenged 'capture' accepted later), others are retries.
+            models.UniqueConstraint(
+                fields=['transaction_id', 'transaction_status', 'fraud_status'],
+                condition=models.Q(fraud_status__isnull=False, duplicate=False),
+                name='midtrans_notification_unique_status_fraud'),
+            models.UniqueConstraint(
+                fields=['transaction_id', 'transaction_status'],
+                condition=models.Q(fraud_status__isnull=True, duplicate=False),
+                name='midtrans_notification_unique_status'),
+        ]
+
     def __str__(self):
         return self.created.strftime('%Y-%m-%d %H:%M:%S')
 
@@ -369,54 +452,102 @@ class MidtransPaymentNotification(models.Model):
     @staticmethod
     def create_from_payload(payload: dict):
         """
+        Store a notification, returns `(notification, created)`.
+        Midtrans retries notifications until acknowledged, a retried one isn't
+        stored again (see constraints) and the stored one is returned instead.
         Only use this method on verified and trusted payload.
         """
-        with transaction.atomic():
-            payment_type = payload.get('payment_type')
-            transaction_id = payload.get('transaction_id')
-            transaction_status = payload.get('transaction_status')
-            fraud_status = payload.get('fraud_status')
-            status_code = int(payload.get('status_code'))
-            gross_amount = float(payload.get('gross_amount', '0'))
-            order_id = payload.get('order_id')
-            purchase = ProAccessPurchase.safe_get(order_id)
-
-            payment_notification = MidtransPaymentNotification(
-                purchase=purchase,
-                payment_type=payment_type,
+        transaction_id = payload.get('transaction_id')
+        transaction_status = payload.get('transaction_status')
+        fraud_status = payload.get('fraud_status')
+        try:
+            purchase_id = uuid.UUID(str(payload.get('order_id')))
+        except ValueError:
+            purchase_id = None
+        payment_notification = MidtransPaymentNotification(
+            purchase_id=purchase_id,
+            payment_type=payload.get('payment_type'),
+            transaction_id=transaction_id,
+            transaction_status=transaction_status,
+            fraud_status=fraud_status,
+            status_code=int(payload.get('status_code')),
+            gross_amount=float(payload.get('gross_amount', '0')),
+            payload=payload
+        )
+        try:
+            with transaction.atomic():
+                if purchase_id and not ProAccessPurchase.objects.filter(pk=purchase_id).exists():
+                    payment_notification.purchase_id = None
+                payment_notification.save()
+                return payment_notification, True
+        except IntegrityError:
+            return MidtransPaymentNotification.objects.get(
                 transaction_id=transaction_id,
                 transaction_status=transaction_status,
                 fraud_status=fraud_status,
-                status_code=status_code,
-                gross_amount=gross_amount,
-                payload=payload
-            )
-            payment_notification.save()
-
-            if purchase:
-                if payment_notification.is_payment_success():
-                    purchase.status = ProAccessPurchase.STATUS_PAYMENT_PAID
-                    purchase.pro_access.extend_days(purchase.days)
-                    purchase.save()
-                elif transaction_status == 'expire':
-                    purchase.status = ProAccessPurchase.STATUS_PAYMENT_EXPIRED
-                    purchase.save()
-                elif transaction_status in ['refund', 'partial_refund']:
-                    purchase.status = ProAccessPurchase.STATUS_PAYMENT_REFUND
-                    purchase.save()
-                elif transaction_status in ['pending', 'cancel', 'deny']:
-                    # IF if cancel, deny or pending after transaction status was paid (rare case)
-                    # THEN set puchase review_required=True
-                    if purchase.status == ProAccessPurchase.STATUS_PAYMENT_PAID:
-                        purchase.review_required = True
-                    else:
-                        if transaction_status == 'pending':
-                            purchase.status = ProAccessPurchase.STATUS_PAYMENT_PENDING
-                        if transaction_status == 'deny':
-                            purchase.status = ProAccessPurchase.STATUS_PAYMENT_FAILED
-                        if transaction_status == 'cancel':
-                            purchase.status = ProAccessPurchase.STATUS_PAYMENT_CANCELED
-                    purchase.save()
-                else:
-                    purchase.review_required = True
-                    purchase.save()
+                duplicate=False), False
+
+    @staticmethod
+    def process_by_id(notification_id, force=False):
+        """
+        Apply a stored notification to its purchase, once (unless `force`).
+        The notification, purchase and pro access rows are locked meanwhile,
+        so concurrent notifications of the same purchase are applied one by one.
+        Returns `False` when the notification was already processed.
+        """
+        with transaction.atomic():
+            notification = MidtransPaymentNotification.objects.select_for_update() \
+                .get(pk=notification_id)
+            if notification.processed and not force:
+                return False
+            notification.apply()
+            notification.processed = now()
+            notification.save(update_fields=['processed', 'updated'])
+        return True
+
+    def apply(self):
+        """
+        Update status of the purchase according to this notification,
+        must be called within a transaction (see `process_by_id()`).
+        """
+        if not self.purchase_id:
+            return
+        purchase = ProAccessPurchase.objects.select_for_update() \
+            .select_related('pro_access').get(pk=self.purchase_id)
+        transaction_status = self.transaction_status
+        refund = transaction_status in ['refund', 'partial_refund']
+        if purchase.status in [ProAccessPurchase.STATUS_PAYMENT_PAID,
+                               ProAccessPurchase.STATUS_PAYMENT_REFUND]:
+            # 'capture' and 'settlement' of a payment are both successes, access is
+            # extended by the first one only. Otherwise a paid purchase is only ever
+            # refunded, late or replayed (`--force`) notifications never downgrade
+            # it (nor a refunded one) and flag it for review instead.
+            if self.is_payment_success():
+                return
+            if refund:
+                purchase.status = ProAccessPurchase.STATUS_PAYMENT_REFUND
+            else:
+                purchase.review_required = True
+            purchase.save()
+        elif self.is_payment_success():
+            purchase.status = ProAccessPurchase.STATUS_PAYMENT_PAID
+            pro_access = ProAccess.objects.select_for_update().get(pk=purchase.pro_access_id)
+            pro_access.extend_days(purchase.days)
+            purchase.save()
+        elif transaction_status == 'expire':
+            purchase.status = ProAccessPurchase.STATUS_PAYMENT_EXPIRED
+            purchase.save()
+        elif refund:
+            purchase.status = ProAccessPurchase.STATUS_PAYMENT_REFUND
+            purchase.save()
+        elif transaction_status in ['pending', 'cancel', 'deny']:
+            if transaction_status == 'pending':
+                purchase.status = ProAccessPurchase.STATUS_PAYMENT_PENDING
+            if transaction_status == 'deny':
+                purchase.status = ProAccessPurchase.STATUS_PAYMENT_FAILED
+            if transaction_status == 'cancel':
+                purchase.status = ProAccessPurchase.STATUS_PAYMENT_CANCELED
+            purchase.save()
+        else:
+            purchase.review_required = True
+            purchase.save()
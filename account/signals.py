@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import invalidate_user
+from .models import User, Link, ProAccess
+
+
+@receiver(post_save, sender=User, dispatch_uid='User:post_save')
+@receiver(post_delete, sender=User, dispatch_uid='User:post_delete')
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Link, dispatch_uid='Link:post_save')
+@receiver(post_save, sender=ProAccess, dispatch_uid='ProAccess:post_save')
+@receiver(post_delete, sender=Link, dispatch_uid='Link:post_delete')
+@receiver(post_delete, sender=ProAccess, dispatch_uid='ProAccess:post_delete')
+def user_relation_changed(sender, instance, **kwargs):
+    # cached users carry these along
+    invalidate_user(instance.user_id)
@@ -1,3 +1,55 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from account.models import MidtransPaymentNotification, ProAccess, ProAccessPurchase, User
+
+
+@mock.patch('account.views.is_payment_notification_valid', return_value=True)
+class MidtransPaymentNotificationTest(TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='alice')
+        self.pro_access = ProAccess.objects.create(user=user)
+        self.purchase = ProAccessPurchase.objects.create(
+            user=user, pro_access=self.pro_access, plan_name='Plan', days=30, price=1)
+        self.client = Client(HTTP_HOST='localhost')
+
+    def notify(self, transaction_status, status_code='200'):
+        payload = {
+            'transaction_id': 'transaction-1',
+            'transaction_status': transaction_status,
+            'order_id': str(self.purchase.pk),
+            'status_code': status_code,
+            'payment_type': 'bank_transfer',
+            'gross_amount': '1.00',
+        }
+        url = reverse('account:midtrans_payment_notification', args=['merchant'])
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_applied_before_acknowledged(self, is_valid):
+        self.assertEqual(self.notify('settlement').status_code, 200)
+        self.purchase.refresh_from_db()
+        self.pro_access.refresh_from_db()
+        self.assertEqual(self.purchase.status, ProAccessPurchase.STATUS_PAYMENT_PAID)
+        self.assertIsNotNone(self.pro_access.end)
+        self.assertIsNotNone(MidtransPaymentNotification.objects.get().processed)
+
+    def test_retry_applied_once(self, is_valid):
+        self.notify('settlement')
+        self.pro_access.refresh_from_db()
+        end = self.pro_access.end
+
+        self.assertEqual(self.notify('settlement').status_code, 200)
+        self.pro_access.refresh_from_db()
+        self.assertEqual(self.pro_access.end, end)
+        self.assertEqual(MidtransPaymentNotification.objects.count(), 1)
+
+    def test_paid_purchase_not_downgraded(self, is_valid):
+        self.notify('settlement')
+        self.notify('expire', status_code='407')
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.status, ProAccessPurchase.STATUS_PAYMENT_PAID)
+        self.assertTrue(self.purchase.review_required)
@@ -1,21 +1,21 @@
 import logging
 import json
 import jwt
-from django.http.response import HttpResponse, HttpResponseBadRequest
+from django.http.response import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from django.contrib.auth import views
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.views.generic import View, TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.conf import settings
 
 from django_email_verification import send_email as send_verification_email
-from stream_django.enrich import Enrich
-from upkoding.activity_feed import feed_manager
+from upkoding.activity_feed import feed_manager, ActivityEnrich
 
 from projects.models import UserProject
 from .midtrans import is_payment_notification_valid
@@ -66,16 +66,11 @@ class IndexView(LoginRequiredMixin, TemplateView):
         user = self.request.user
         if request.GET.get("partial") == "notifications":
             try:
-                enricher = Enrich(
-                    (
-                        "actor",
-                        "object",
-                        "target",
-                    )
-                )
+                enricher = ActivityEnrich()
                 feed = feed_manager.get_notification_feed(user.id)
                 activities = feed.get(limit=10)["results"]
                 enriched = enricher.enrich_aggregated_activities(activities)
+                feed_manager.reset_unread_count(user.id)
             except Exception:
                 enriched = []
             finally:
@@ -87,6 +82,14 @@ class IndexView(LoginRequiredMixin, TemplateView):
         return super().get(request)
 
 
+@login_required
+def notifications_unread(request):
+    """
+    Number of notifications since user last open their notifications.
+    """
+    return JsonResponse({"unread": feed_manager.get_unread_count(request.user.id)})
+
+
 class ProfileFormView(LoginRequiredMixin, View):
     def __render(self, request, form, **kwargs):
         return render(request, "account/form_profile.html", {"form": form, **kwargs})
@@ -206,6 +209,8 @@ class DiscordFormView(LoginRequiredMixin, View):
 
 
 class ProStatusView(LoginRequiredMixin, View):
+    purchases_per_page = 10
+
     def _render(self, request, **kwargs):
         selected_plan = request.GET.get("plan")
 
@@ -218,7 +223,9 @@ class ProStatusView(LoginRequiredMixin, View):
         except Exception:
             pro_access = None
 
-        purchases = ProAccessPurchase.objects.filter(user=request.user)
+        purchases = Paginator(
+            ProAccessPurchase.objects.filter(user=request.user), self.purchases_per_page
+        ).get_page(request.GET.get("page"))
 
         return render(
             request,
@@ -340,7 +347,10 @@ def midtrans_payment_notification(request, merchant_id):
         payload = json.loads(request.body)
         is_valid = is_payment_notification_valid(merchant_id, payload)
         if is_valid:
-            MidtransPaymentNotification.create_from_payload(payload)
+            # applied before it's acknowledged, Midtrans retries until it gets a 2xx.
+            # applied once, retries of an applied notification change nothing.
+            notification, _ = MidtransPaymentNotification.create_from_payload(payload)
+            MidtransPaymentNotification.process_by_id(notification.pk)
             return HttpResponse()
         return HttpResponseBadRequest("Notification payload invalid")
 
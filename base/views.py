@@ -1,11 +1,10 @@
 import logging
 from django.http.response import HttpResponse
-from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.views.generic.base import TemplateView
-from stream_django.enrich import Enrich
 from django.conf import settings
 
-from upkoding.activity_feed import feed_manager
+from upkoding.activity_feed import feed_manager, ActivityEnrich
 from projects.models import Project
 from roadmaps.models import Roadmap
 
@@ -28,15 +27,22 @@ class Index(TemplateView):
         data['roadmaps'] = Roadmap.objects.filter(status=Roadmap.STATUS_ACTIVE)
         return data
 
+    def render_activities(self, feed):
+        enricher = ActivityEnrich()
+        activities = feed.get(limit=10)['results']
+        enriched = enricher.enrich_aggregated_activities(activities)
+        return render_to_string('base/_activities.html', {'activities': enriched})
+
     def get(self, request):
         if request.GET.get('partial') == 'activities':
             try:
-                enricher = Enrich(('actor', 'object', 'target'))
+                # global feed is the same for everyone, serve it from cache.
                 feed = feed_manager.get_global_challenge_feed()
-                activities = feed.get(limit=10)['results']
-                enriched = enricher.enrich_aggregated_activities(activities)
-                return render(request, 'base/_activities.html', {'activities': enriched})
+                content = feed_manager.get_cached_fragment(
+                    feed, lambda: self.render_activities(feed))
+                return HttpResponse(content)
             except Exception as e:
+                log.error(str(e))
                 return HttpResponse()
         return super().get(request)
 
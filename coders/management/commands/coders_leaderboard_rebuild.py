@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils.timezone import now, utc
+
+from account.models import User
+from coders.models import PointEntry, Score
+
+
+class Command(BaseCommand):
+    help = 'Recompute leaderboard scores and ranks from the points ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Add an opening entry for users whose point differs from their ledger '
+                                 '(eg. points earned before the ledger existed)')
+        parser.add_argument('--all', action='store_true',
+                            help='Rebuild every past month and week too, not only the current ones')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            self.reconcile()
+
+        periods = Score.periods_of(now())
+        if options['all']:
+            entries = PointEntry.objects.filter(earned__gt=Score.ALL_TIME_START_AT)
+            for period, trunc in ((Score.PERIOD_MONTH, TruncMonth), (Score.PERIOD_WEEK, TruncWeek)):
+                starts = entries.annotate(start=trunc('earned', tzinfo=utc)) \
+                    .values_list('start', flat=True).distinct()
+                periods += [(period, start.date()) for start in starts]
+
+        for period, period_start in sorted(set(periods)):
+            Score.rebuild(period, period_start)
+            self.stdout.write(self.style.SUCCESS(
+                f'[OK] {Score(period=period).get_period_display()} {period_start}: '
+                f'{Score.objects.filter(period=period, period_start=period_start).count()} score(s)'))
+
+    def reconcile(self):
+        # earned at the all-time start, these only count in the all-time scores.
+        earned = Score.ALL_TIME_START_AT
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {PointEntry._meta.db_table} '
+                '(user_id, points, reason, reference, created, earned) '
+                "SELECT u.id, u.point - COALESCE(l.points, 0), %s, '', %s, %s "
+                f'FROM {User._meta.db_table} u LEFT JOIN ('
+                f'SELECT user_id, SUM(points) AS points FROM {PointEntry._meta.db_table} '
+                'GROUP BY user_id) l ON l.user_id = u.id '
+                'WHERE u.point != COALESCE(l.points, 0)',
+                [PointEntry.REASON_OPENING, now(), earned])
+            self.stdout.write(self.style.SUCCESS(
+                f'[OK] {cursor.rowcount} opening entry(ies) added'))
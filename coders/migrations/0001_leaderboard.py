@@ -0,0 +1,78 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('reason', models.CharField(blank=True, choices=[('opening', 'Saldo awal'), ('project_complete', 'Proyek selesai'), ('project_incomplete', 'Proyek batal selesai')], max_length=50)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Score',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.PositiveSmallIntegerField(choices=[(0, 'Sepanjang masa'), (1, 'Bulan ini'), (2, 'Minggu ini')])),
+                ('period_start', models.DateField()),
+                ('score', models.IntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScoreRank',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.PositiveSmallIntegerField(choices=[(0, 'Sepanjang masa'), (1, 'Bulan ini'), (2, 'Minggu ini')])),
+                ('period_start', models.DateField()),
+                ('score', models.IntegerField()),
+                ('users', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='scorerank',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'score'), name='coders_scorerank_unique_period_score'),
+        ),
+        migrations.AddField(
+            model_name='score',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='pointentry',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='score',
+            index=models.Index(fields=['period', 'period_start', '-score', 'user'], name='coders_score_top'),
+        ),
+        migrations.AddConstraint(
+            model_name='score',
+            constraint=models.UniqueConstraint(fields=('period', 'period_start', 'user'), name='coders_score_unique_period_user'),
+        ),
+        migrations.AddIndex(
+            model_name='pointentry',
+            index=models.Index(fields=['user', 'created'], name='coders_pointentry_user'),
+        ),
+        migrations.AddIndex(
+            model_name='pointentry',
+            index=models.Index(fields=['created'], name='coders_pointentry_created'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.6 on 2026-10-19 17:00
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def backfill_earned(apps, schema_editor):
+    """
+    Points recorded so far counted when they were recorded.
+    """
+    PointEntry = apps.get_model('coders', 'PointEntry')
+    PointEntry.objects.update(earned=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coders', '0001_leaderboard'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pointentry',
+            name='coders_pointentry_created',
+        ),
+        migrations.AddField(
+            model_name='pointentry',
+            name='earned',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='pointentry',
+            name='reference',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(backfill_earned, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pointentry',
+            index=models.Index(fields=['earned'], name='coders_pointentry_earned'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.1.6 on 2026-10-19 17:12
+
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import migrations
+from django.utils.timezone import now, utc
+
+# see `coders.models`
+LOCK_NAMESPACE = 4046
+PERIOD_ALL_TIME = 0
+ALL_TIME_START = date(1970, 1, 1)
+
+
+def seed_opening_scores(apps, schema_editor):
+    """
+    Points earned before the ledger existed become opening entries (all-time
+    only, like `coders_leaderboard_rebuild --reconcile` does), then all-time
+    scores and ranks are rebuilt, so the leaderboard is complete once deployed.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    PointEntry = apps.get_model('coders', 'PointEntry')
+    Score = apps.get_model('coders', 'Score')
+    ScoreRank = apps.get_model('coders', 'ScoreRank')
+    user_table = User._meta.db_table
+    entry_table = PointEntry._meta.db_table
+    score_table = Score._meta.db_table
+    rank_table = ScoreRank._meta.db_table
+    earned = datetime.combine(ALL_TIME_START, time(), tzinfo=utc)
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)',
+                       [LOCK_NAMESPACE, PERIOD_ALL_TIME * 1000000 + ALL_TIME_START.toordinal()])
+        cursor.execute(
+            f'INSERT INTO {entry_table} '
+            '(user_id, points, reason, reference, created, earned) '
+            "SELECT u.id, u.point - COALESCE(l.points, 0), 'opening', '', %s, %s "
+            f'FROM {user_table} u LEFT JOIN ('
+            f'SELECT user_id, SUM(points) AS points FROM {entry_table} '
+            'GROUP BY user_id) l ON l.user_id = u.id '
+            'WHERE u.point != COALESCE(l.points, 0)',
+            [now(), earned])
+        cursor.execute(
+            f'DELETE FROM {score_table} WHERE period = %s AND period_start = %s',
+            [PERIOD_ALL_TIME, ALL_TIME_START])
+        cursor.execute(
+            f'INSERT INTO {score_table} (period, period_start, user_id, score, updated) '
+            f'SELECT %s, %s, user_id, SUM(points), %s FROM {entry_table} GROUP BY user_id',
+            [PERIOD_ALL_TIME, ALL_TIME_START, now()])
+        cursor.execute(
+            f'DELETE FROM {rank_table} WHERE period = %s AND period_start = %s',
+            [PERIOD_ALL_TIME, ALL_TIME_START])
+        cursor.execute(
+            f'INSERT INTO {rank_table} (period, period_start, score, users, rank) '
+            'SELECT %s, %s, score, COUNT(*), '
+            '1 + COALESCE(SUM(COUNT(*)) OVER (ORDER BY score DESC '
+            'ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) '
+            f'FROM {score_table} WHERE period = %s AND period_start = %s '
+            'GROUP BY score',
+            [PERIOD_ALL_TIME, ALL_TIME_START, PERIOD_ALL_TIME, ALL_TIME_START])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('coders', '0002_pointentry_reference_earned'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_opening_scores, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,307 @@
-from django.db import models
+from datetime import date, datetime, time, timedelta
 
-# Create your models here.
+from django.conf import settings
+from django.contrib.humanize.templatetags import humanize
+from django.db import connection, models, transaction
+from django.utils.timezone import now, utc
+
+# `pg_advisory_xact_lock()` namespace of leaderboard writes.
+LOCK_NAMESPACE = 4046
+
+
+class PointEntry(models.Model):
+    """
+    Append-only ledger of point changes, written by `User.add_point()`
+    and `User.remove_point()`. `User.point` is the sum of all entries.
+    """
+    REASON_OPENING = 'opening'
+    REASON_PROJECT_COMPLETE = 'project_complete'
+    REASON_PROJECT_INCOMPLETE = 'project_incomplete'
+    REASONS = (
+        (REASON_OPENING, 'Saldo awal'),
+        (REASON_PROJECT_COMPLETE, 'Proyek selesai'),
+        (REASON_PROJECT_INCOMPLETE, 'Proyek batal selesai'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             db_index=False, related_name='+')
+    points = models.IntegerField()
+    reason = models.CharField(max_length=50, choices=REASONS, blank=True)
+    # what the points are for (eg. 'userproject:12'), so they can be reversed.
+    reference = models.CharField(max_length=100, blank=True)
+    created = models.DateTimeField(default=now)
+    # when the points count (see `Score.periods_of()`), `created` except for reversals
+    # which count when the reversed points did.
+    earned = models.DateTimeField(default=now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created'], name='coders_pointentry_user'),
+            models.Index(fields=['earned'], name='coders_pointentry_earned'),
+        ]
+
+    def __str__(self):
+        return f'user={self.user_id} points={self.points} ({self.reason})'
+
+    @classmethod
+    def record(cls, user_id, points, reason='', reference=''):
+        """
+        Append an entry and apply it to the scores of every period, in the
+        caller's transaction.
+        Removed points (`points < 0`) with a `reference` are taken from the periods
+        the latest points added with that reference were earned in, or from the
+        all-time scores only when there are none (eg. earned before the ledger existed).
+        """
+        if not points:
+            return None
+        with transaction.atomic():
+            earned = now()
+            if points < 0 and reference:
+                earned = cls.objects.filter(
+                    user_id=user_id, reference=reference, points__gt=0
+                ).order_by('-created').values_list('earned', flat=True).first() \
+                    or Score.ALL_TIME_START_AT
+            entry = cls.objects.create(user_id=user_id, points=points, reason=reason,
+                                       reference=reference, earned=earned)
+            for period, period_start in Score.periods_of(entry.earned):
+                Score.add(period, period_start, user_id, points)
+        return entry
+
+
+class Score(models.Model):
+    """
+    Points of a user within a period (rollup of `PointEntry`).
+    Users without entries in a period have no score, thus no rank, in it.
+    """
+    PERIOD_ALL_TIME = 0
+    PERIOD_MONTH = 1
+    PERIOD_WEEK = 2
+    PERIODS = (
+        (PERIOD_ALL_TIME, 'Sepanjang masa'),
+        (PERIOD_MONTH, 'Bulan ini'),
+        (PERIOD_WEEK, 'Minggu ini'),
+    )
+    # `period_start` of all-time scores.
+    ALL_TIME_START = date(1970, 1, 1)
+    # entries earned then only count in all-time scores (eg. opening balances).
+    ALL_TIME_START_AT = datetime.combine(ALL_TIME_START, time(), tzinfo=utc)
+
+    period = models.PositiveSmallIntegerField(choices=PERIODS)
+    period_start = models.DateField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             db_index=False, related_name='+')
+    score = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'user'],
+                                    name='coders_score_unique_period_user'),
+        ]
+        indexes = [
+            # top N of a period
+            models.Index(fields=['period', 'period_start', '-score', 'user'],
+                         name='coders_score_top'),
+        ]
+
+    def __str__(self):
+        return f'user={self.user_id} period={self.period}:{self.period_start} score={self.score}'
+
+    def get_score_display(self):
+        return '{}{}'.format(humanize.intcomma(self.score), settings.POINT_UNIT)
+
+    @classmethod
+    def period_start_of(cls, period, at):
+        """
+        Start date (UTC) of the `period` including datetime `at`.
+        """
+        day = at.date()
+        if period == cls.PERIOD_MONTH:
+            return day.replace(day=1)
+        if period == cls.PERIOD_WEEK:
+            # weeks start on monday, like postgres `date_trunc('week', ...)`
+            return day - timedelta(days=day.weekday())
+        return cls.ALL_TIME_START
+
+    @classmethod
+    def periods_of(cls, at):
+        """
+        Returns `[(period, period_start), ...]` of every period including datetime `at`.
+        """
+        if at <= cls.ALL_TIME_START_AT:
+            return [(cls.PERIOD_ALL_TIME, cls.ALL_TIME_START)]
+        return [(period, cls.period_start_of(period, at)) for period, _ in cls.PERIODS]
+
+    @classmethod
+    def lock(cls, period, period_start):
+        """
+        Serialize writers of a period for the rest of the transaction,
+        rank updates of concurrent writers would overlap otherwise.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)',
+                           [LOCK_NAMESPACE, period * 1000000 + period_start.toordinal()])
+
+    @classmethod
+    def add(cls, period, period_start, user_id, points):
+        """
+        Add `points` to the score of `user_id` and update ranks accordingly.
+        Must be called within a transaction.
+        """
+        cls.lock(period, period_start)
+        score = cls.objects.filter(
+            period=period, period_start=period_start, user_id=user_id).first()
+        if score is None:
+            old = None
+            cls.objects.create(period=period, period_start=period_start,
+                               user_id=user_id, score=points)
+        else:
+            old = score.score
+            score.score += points
+            score.save(update_fields=['score', 'updated'])
+        ScoreRank.move(period, period_start, old, (old or 0) + points)
+
+    @classmethod
+    def rebuild(cls, period, period_start):
+        """
+        Recompute scores and ranks of a period from the ledger.
+        """
+        table = cls._meta.db_table
+        entry_table = PointEntry._meta.db_table
+        where = ''
+        params = [period, period_start, now()]
+        if period != cls.PERIOD_ALL_TIME:
+            start = datetime.combine(period_start, time(), tzinfo=utc)
+            if period == cls.PERIOD_MONTH:
+                end = (start + timedelta(days=32)).replace(day=1)
+            else:
+                end = start + timedelta(days=7)
+            where = 'WHERE earned >= %s AND earned < %s '
+            params += [start, end]
+
+        with transaction.atomic():
+            cls.lock(period, period_start)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE period = %s AND period_start = %s',
+                    [period, period_start])
+                cursor.execute(
+                    f'INSERT INTO {table} (period, period_start, user_id, score, updated) '
+                    f'SELECT %s, %s, user_id, SUM(points), %s FROM {entry_table} '
+                    f'{where}GROUP BY user_id',
+                    params)
+            ScoreRank.rebuild(period, period_start)
+
+    @classmethod
+    def top(cls, period, period_start, limit, **filters):
+        """
+        Returns the `limit` best scores of a period (matching `filters`, eg.
+        `user__is_active=True`), each with its `rank`, read from the
+        `coders_score_top` index.
+        """
+        scores = list(
+            cls.objects.select_related('user')
+            .filter(period=period, period_start=period_start, score__gt=0, **filters)
+            .order_by('-score', 'user_id')[:limit]
+        )
+        ranks = ScoreRank.ranks_of(period, period_start, {score.score for score in scores})
+        for score in scores:
+            score.rank = ranks.get(score.score)
+        return scores
+
+    @classmethod
+    def rank_of(cls, period, period_start, user_id):
+        """
+        Returns `(score, rank)` of `user_id` in a period, `(None, None)` when unranked.
+        """
+        score = cls.objects.filter(
+            period=period, period_start=period_start, user_id=user_id
+        ).values_list('score', flat=True).first()
+        if score is None:
+            return None, None
+        return score, ScoreRank.ranks_of(period, period_start, [score]).get(score)
+
+
+class ScoreRank(models.Model):
+    """
+    Rank of every distinct score of a period: `1 + number of users with a higher score`,
+    so tied users share a rank. Maintained by `Score.add()` as scores change, one
+    score change updates the ranks between its old and new score, never the users.
+    """
+    period = models.PositiveSmallIntegerField(choices=Score.PERIODS)
+    period_start = models.DateField()
+    score = models.IntegerField()
+    # users having exactly this score, kept when it drops to 0.
+    users = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'score'],
+                                    name='coders_scorerank_unique_period_score'),
+        ]
+
+    def __str__(self):
+        return f'period={self.period}:{self.period_start} score={self.score} rank={self.rank}'
+
+    @classmethod
+    def move(cls, period, period_start, old, new):
+        """
+        Move a user from score `old` (`None` when unranked) to score `new`.
+        """
+        if old == new:
+            return
+        ranks = cls.objects.filter(period=period, period_start=period_start)
+        if old is None:
+            # now above every lower score
+            ranks.filter(score__lt=new).update(rank=models.F('rank') + 1)
+        else:
+            ranks.filter(score=old).update(users=models.F('users') - 1)
+            if new > old:
+                # now above the ones left at `old` and the scores passed.
+                ranks.filter(score__gte=old, score__lt=new).update(rank=models.F('rank') + 1)
+            else:
+                # no longer above the scores passed and the ones at `new`.
+                ranks.filter(score__gte=new, score__lt=old).update(rank=models.F('rank') - 1)
+
+        if ranks.filter(score=new).update(users=models.F('users') + 1):
+            return
+        # first user with this score: ranked right after the next higher score.
+        higher = ranks.filter(score__gt=new).order_by('score').first()
+        cls.objects.create(
+            period=period, period_start=period_start, score=new, users=1,
+            rank=higher.rank + higher.users if higher else 1)
+
+    @classmethod
+    def ranks_of(cls, period, period_start, scores):
+        """
+        Returns `{score: rank}` of `scores` in a period.
+        """
+        if not scores:
+            return {}
+        return dict(
+            cls.objects.filter(period=period, period_start=period_start, score__in=scores)
+            .values_list('score', 'rank')
+        )
+
+    @classmethod
+    def rebuild(cls, period, period_start):
+        """
+        Recompute ranks of a period from its scores, within the caller's
+        transaction (see `Score.rebuild()`).
+        """
+        table = cls._meta.db_table
+        score_table = Score._meta.db_table
+        Score.lock(period, period_start)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE period = %s AND period_start = %s',
+                [period, period_start])
+            cursor.execute(
+                f'INSERT INTO {table} (period, period_start, score, users, rank) '
+                'SELECT %s, %s, score, COUNT(*), '
+                '1 + COALESCE(SUM(COUNT(*)) OVER (ORDER BY score DESC '
+                'ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0) '
+                f'FROM {score_table} WHERE period = %s AND period_start = %s '
+                'GROUP BY score',
+                [period, period_start, period, period_start])
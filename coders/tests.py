@@ -1,3 +1,169 @@
-from django.test import TestCase
+import random
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import utc
+
+from account.models import User
+from coders.models import PointEntry, Score, ScoreRank
+
+WEEK_1 = datetime(2021, 11, 29, 12, tzinfo=utc)  # monday, november
+WEEK_2 = datetime(2021, 12, 6, 12, tzinfo=utc)  # monday, december
+
+
+class LeaderboardTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'coder{i}') for i in range(6)]
+
+    def record(self, user, points, at=WEEK_1, reference=''):
+        with mock.patch('coders.models.now', return_value=at):
+            return PointEntry.record(user.pk, points, reference=reference)
+
+    def ranks(self, period, period_start):
+        return {user_id: Score.rank_of(period, period_start, user_id)
+                for user_id in Score.objects.filter(period=period, period_start=period_start)
+                .values_list('user_id', flat=True)}
+
+    def expected_ranks(self, period, period_start):
+        scores = dict(Score.objects.filter(period=period, period_start=period_start)
+                      .values_list('user_id', 'score'))
+        return {user_id: (score, 1 + sum(1 for other in scores.values() if other > score))
+                for user_id, score in scores.items()}
+
+
+class ScoreRankMoveTest(LeaderboardTestCase):
+
+    def test_ties_share_rank(self):
+        a, b, c, d = self.users[:4]
+        self.record(a, 10)
+        self.record(b, 10)
+        self.record(c, 5)
+        self.record(d, 20)
+        period = (Score.PERIOD_WEEK, WEEK_1.date())
+        self.assertEqual(Score.rank_of(*period, a.pk), (10, 2))
+        self.assertEqual(Score.rank_of(*period, b.pk), (10, 2))
+        # after both tied users
+        self.assertEqual(Score.rank_of(*period, c.pk), (5, 4))
+        self.assertEqual(Score.rank_of(*period, d.pk), (20, 1))
+
+    def test_move_up_and_down(self):
+        a, b, c = self.users[:3]
+        self.record(a, 10)
+        self.record(b, 20)
+        self.record(c, 30)
+        period = (Score.PERIOD_WEEK, WEEK_1.date())
+
+        # passes b, ties c
+        self.record(a, 20)
+        self.assertEqual(Score.rank_of(*period, a.pk), (30, 1))
+        self.assertEqual(Score.rank_of(*period, c.pk), (30, 1))
+        self.assertEqual(Score.rank_of(*period, b.pk), (20, 3))
+
+        # drops below b
+        self.record(a, -25)
+        self.assertEqual(Score.rank_of(*period, a.pk), (5, 3))
+        self.assertEqual(Score.rank_of(*period, b.pk), (20, 2))
+        self.assertEqual(Score.rank_of(*period, c.pk), (30, 1))
+
+    def test_matches_full_rebuild(self):
+        rng = random.Random(4046)
+        for _ in range(200):
+            self.record(rng.choice(self.users), rng.choice([-10, -5, 5, 10, 15]))
+
+        for period, period_start in Score.periods_of(WEEK_1):
+            self.assertEqual(self.ranks(period, period_start),
+                             self.expected_ranks(period, period_start))
+            moved = list(ScoreRank.objects.filter(period=period, period_start=period_start)
+                         .order_by('score').values_list('score', 'users', 'rank'))
+            Score.rebuild(period, period_start)
+            rebuilt = list(ScoreRank.objects.filter(period=period, period_start=period_start)
+                           .order_by('score').values_list('score', 'users', 'rank'))
+            # move() keeps emptied scores around, with no users.
+            self.assertEqual([row for row in moved if row[1]], rebuilt)
+
+
+class PeriodTest(LeaderboardTestCase):
+
+    def test_rollover(self):
+        a, b = self.users[:2]
+        self.record(a, 10, at=WEEK_1)
+        self.record(b, 5, at=WEEK_2)
+
+        self.assertEqual(Score.rank_of(Score.PERIOD_WEEK, WEEK_1.date(), a.pk), (10, 1))
+        self.assertEqual(Score.rank_of(Score.PERIOD_WEEK, WEEK_2.date(), a.pk), (None, None))
+        self.assertEqual(Score.rank_of(Score.PERIOD_WEEK, WEEK_2.date(), b.pk), (5, 1))
+        self.assertEqual(Score.rank_of(Score.PERIOD_MONTH, WEEK_2.date().replace(day=1), b.pk),
+                         (5, 1))
+        self.assertEqual(Score.rank_of(Score.PERIOD_ALL_TIME, Score.ALL_TIME_START, a.pk),
+                         (10, 1))
+
+    def test_reversal_debits_earned_period(self):
+        a = self.users[0]
+        self.record(a, 10, at=WEEK_1, reference='userproject:1')
+        entry = self.record(a, -10, at=WEEK_2, reference='userproject:1')
+
+        self.assertEqual(entry.earned, WEEK_1)
+        self.assertEqual(Score.rank_of(Score.PERIOD_WEEK, WEEK_1.date(), a.pk)[0], 0)
+        self.assertEqual(Score.rank_of(Score.PERIOD_MONTH, WEEK_1.date().replace(day=1), a.pk)[0], 0)
+        self.assertEqual(Score.rank_of(Score.PERIOD_ALL_TIME, Score.ALL_TIME_START, a.pk)[0], 0)
+        self.assertEqual(Score.rank_of(Score.PERIOD_WEEK, WEEK_2.date(), a.pk), (None, None))
+
+    def test_reversal_without_earned_points(self):
+        a = self.users[0]
+        entry = self.record(a, -10, at=WEEK_2, reference='userproject:1')
+
+        # earned before the ledger existed: all-time only.
+        self.assertEqual(entry.earned, Score.ALL_TIME_START_AT)
+        self.assertEqual(Score.rank_of(Score.PERIOD_ALL_TIME, Score.ALL_TIME_START, a.pk)[0], -10)
+        self.assertEqual(Score.rank_of(Score.PERIOD_WEEK, WEEK_2.date(), a.pk), (None, None))
+
+    def test_rebuild_uses_earned_period(self):
+        a = self.users[0]
+        self.record(a, 10, at=WEEK_1, reference='userproject:1')
+        self.record(a, -10, at=WEEK_2, reference='userproject:1')
+        for period, period_start in Score.periods_of(WEEK_1) + Score.periods_of(WEEK_2):
+            before = self.ranks(period, period_start)
+            Score.rebuild(period, period_start)
+            self.assertEqual(self.ranks(period, period_start), before)
+
+
+class TopTest(LeaderboardTestCase):
+
+    def test_inactive_users_filtered_before_limit(self):
+        a, b, c = self.users[:3]
+        self.record(a, 30)
+        self.record(b, 20)
+        self.record(c, 10)
+        User.objects.filter(pk=a.pk).update(is_active=False)
+
+        scores = Score.top(Score.PERIOD_WEEK, WEEK_1.date(), 2, user__is_active=True)
+        self.assertEqual([(score.user_id, score.rank) for score in scores],
+                         [(b.pk, 2), (c.pk, 3)])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CoderListTest(LeaderboardTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client(HTTP_HOST='localhost')
+
+    def test_directory_lists_coders_without_points(self):
+        response = self.client.get(reverse('coders:list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['paginator'].per_page, 24)
+        self.assertEqual(set(response.context['object_list']), set(self.users))
+
+    def test_leaderboard(self):
+        a, b = self.users[:2]
+        self.record(a, 10, at=datetime.now(utc))
+        User.objects.filter(pk=b.pk).update(is_active=False)
+        self.record(b, 20, at=datetime.now(utc))
+
+        response = self.client.get(reverse('coders:list'), {'period': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(score.user_id, score.rank) for score in response.context['object_list']],
+                         [(a.pk, 2)])
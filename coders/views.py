@@ -1,14 +1,60 @@
 from django.views.generic import ListView, DetailView
 from django.shortcuts import get_object_or_404
+from django.utils.timezone import now
 
 from account.models import User
+from .models import Score
 from projects.models import UserProject
 
 
 class CoderList(ListView):
+    """
+    Paginated directory of active coders, or the leaderboard of a period
+    (`?period=all|month|week`) read from the precomputed scores and ranks
+    of `coders.models`.
+    """
     template_name = 'coders/coder_list.html'
-    queryset = User.objects.filter(is_active=True)
     paginate_by = 24
+    # multiple of 3, coders are listed in 3 columns
+    leaderboard_size = 99
+    periods = {
+        'all': Score.PERIOD_ALL_TIME,
+        'month': Score.PERIOD_MONTH,
+        'week': Score.PERIOD_WEEK,
+    }
+
+    def get_period(self):
+        """
+        Returns `(period, period_start)` of the leaderboard, `(None, None)` for the directory.
+        """
+        period = self.periods.get(self.request.GET.get('period'))
+        if period is None:
+            return None, None
+        return period, Score.period_start_of(period, now())
+
+    def get_paginate_by(self, queryset):
+        period, _ = self.get_period()
+        return self.paginate_by if period is None else None
+
+    def get_queryset(self):
+        period, period_start = self.get_period()
+        if period is None:
+            return User.objects.filter(is_active=True)
+        return Score.top(period, period_start, self.leaderboard_size, user__is_active=True)
+
+    def get_context_data(self, **kwargs):
+        data = super().get_context_data(**kwargs)
+        data['periods'] = [(key, Score(period=value).get_period_display())
+                           for key, value in self.periods.items()]
+        period, period_start = self.get_period()
+        if period is None:
+            return data
+        data['period'] = next(key for key, value in self.periods.items() if value == period)
+        if self.request.user.is_authenticated:
+            score, data['my_rank'] = Score.rank_of(period, period_start, self.request.user.pk)
+            if score is not None:
+                data['my_score'] = Score(score=score).get_score_display()
+        return data
 
 
 class CoderDetail(DetailView):
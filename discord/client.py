@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from discord.conf import API_BASE_URL, BOT_REQUEST_HEADERS
+
+log = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    pass
+
+
+class BotClient:
+    """
+    HTTP client for Discord API.
+    - Reuse connections (single session shared across threads).
+    - Honours per-route rate limit buckets (`X-RateLimit-*` headers), waiting
+      when a bucket is exhausted instead of hitting 429.
+    - On 429 waits for `Retry-After` and retry (global limit pauses every route).
+    https://discord.com/developers/docs/topics/rate-limits
+    """
+
+    def __init__(self, base_url=API_BASE_URL, timeout=10, max_retries=3):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        self.session.headers.update(BOT_REQUEST_HEADERS)
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+
+        self._lock = threading.Lock()
+        # route => bucket hash, bucket hash => (remaining, reset at)
+        self._route_buckets = {}
+        self._buckets = {}
+        self._global_reset_at = 0
+
+    def _wait_for(self, route):
+        with self._lock:
+            reset_at = self._global_reset_at
+            bucket = self._route_buckets.get(route)
+            remaining, bucket_reset_at = self._buckets.get(bucket, (1, 0))
+            if remaining <= 0:
+                reset_at = max(reset_at, bucket_reset_at)
+        delay = reset_at - time.monotonic()
+        if delay > 0:
+            log.info(f"Discord {route} rate limited, waiting {delay:.2f}s")
+            time.sleep(delay)
+
+    def _update_bucket(self, route, resp):
+        bucket = resp.headers.get("X-RateLimit-Bucket")
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset_after = resp.headers.get("X-RateLimit-Reset-After")
+        if not bucket or remaining is None or reset_after is None:
+            return
+        with self._lock:
+            self._route_buckets[route] = bucket
+            self._buckets[bucket] = (
+                int(remaining),
+                time.monotonic() + float(reset_after),
+            )
+
+    def _retry_after(self, resp):
+        try:
+            retry_after = float(resp.json().get("retry_after"))
+        except Exception:
+            retry_after = float(resp.headers.get("Retry-After", 1))
+        if resp.headers.get("X-RateLimit-Global"):
+            with self._lock:
+                self._global_reset_at = time.monotonic() + retry_after
+        return retry_after
+
+    def request(self, method, route, **kwargs):
+        """
+        `route` is the path template, placeholders are filled from `kwargs`,
+        the rest of `kwargs` passed to `requests`.
+        Usage:
+            client.request("DELETE", "/channels/{channel_id}/messages/{message_id}",
+                           channel_id=1, message_id=2)
+
+        Rate limit buckets are tracked per route *and* major parameters
+        (channel_id, guild_id, webhook_id).
+        """
+        path_params = {
+            key: kwargs.pop(key) for key in list(kwargs) if "{" + key + "}" in route
+        }
+        major = [
+            str(path_params[key])
+            for key in ("channel_id", "guild_id", "webhook_id")
+            if key in path_params
+        ]
+        bucket_route = " ".join([method, route] + major)
+        url = self.base_url + route.format(**path_params)
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for(bucket_route)
+            resp = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            self._update_bucket(bucket_route, resp)
+            if resp.status_code != 429:
+                resp.raise_for_status()
+                return resp
+
+            retry_after = self._retry_after(resp)
+            if attempt == self.max_retries:
+                break
+            log.warning(f"Discord {bucket_route} returned 429, retry after {retry_after}s")
+            time.sleep(retry_after)
+        raise RateLimited(f"{bucket_route} still rate limited after {self.max_retries} retries")
+
+    def add_member_role(self, guild_id, user_id, role_id):
+        return self.request(
+            "PUT",
+            "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+            guild_id=guild_id,
+            user_id=user_id,
+            role_id=role_id,
+        )
+
+    def delete_message(self, channel_id, message_id):
+        return self.request(
+            "DELETE",
+            "/channels/{channel_id}/messages/{message_id}",
+            channel_id=channel_id,
+            message_id=message_id,
+        )
+
+    def edit_original_response(self, application_id, interaction_token, data):
+        return self.request(
+            "PATCH",
+            "/webhooks/{webhook_id}/{interaction_token}/messages/@original",
+            webhook_id=application_id,
+            interaction_token=interaction_token,
+            json=data,
+        )
+
+    def create_command(self, application_id, command):
+        return self.request(
+            "POST",
+            "/applications/{application_id}/commands",
+            application_id=application_id,
+            json=command,
+        )
+
+
+bot_client = BotClient()
@@ -1,32 +1,35 @@
 import json
 import logging
-import requests
 from django.utils.timezone import now
 from discord_interactions import InteractionResponseType
 from account.models import User, UserSetting
-from discord.conf import API_BASE_URL, GUILD_ID, UPKODERS_ROLE_ID, BOT_REQUEST_HEADERS
+from discord.client import bot_client
+from discord.conf import APPLICATION_ID, GUILD_ID, UPKODERS_ROLE_ID
+from upkoding.jobs import defer
 
 log = logging.getLogger(__name__)
 
 
 def set_user_role(user_id, role_id):
-    set_role_url = f'{API_BASE_URL}/guilds/{GUILD_ID}/members/{user_id}/roles/{role_id}'
-    resp = requests.put(url=set_role_url, headers=BOT_REQUEST_HEADERS)
-    resp.raise_for_status()
-    return resp
+    return bot_client.add_member_role(GUILD_ID, user_id, role_id)
 
 
 def delete_message(channel_id, message_id):
-    delete_message_url = f'{API_BASE_URL}/channels/{channel_id}/messages/{message_id}'
-    resp = requests.delete(url=delete_message_url, headers=BOT_REQUEST_HEADERS)
-    resp.raise_for_status()
-    return resp
+    return bot_client.delete_message(channel_id, message_id)
+
+
+def edit_original_response(interaction_token, content):
+    return bot_client.edit_original_response(
+        APPLICATION_ID, interaction_token, {'content': content})
 
 
 def verifikasi(command, data):
     """
     Verify user's Discord token.
     Only process interaction from DM message.
+
+    Discord only give us 3 seconds to respond, so we only validate the input here
+    and defer the response, the actual verification done in background by `verify_user`.
     """
     discord_user = data.get('user')
     discord_member = data.get('member')
@@ -48,9 +51,20 @@ def verifikasi(command, data):
         raise Exception('Verifikasi gagal! Format token tidak valid.')
 
     username, token = tokens
+    defer(verify_user, discord_user, username, token, data.get('token'))
+
+    return {
+        'type': InteractionResponseType.DEFERRED_CHANNEL_MESSAGE_WITH_SOURCE,
+    }
+
+
+def verify_user(discord_user, username, token, interaction_token):
+    """
+    Check the token, upgrade user's Discord roles then edit the deferred response.
+    """
     try:
         user = User.objects.get(username=username)
-        
+
         # check token
         user_saved_token = UserSetting.objects.get_setting(
             user=user, key='discord_access_token')
@@ -81,12 +95,11 @@ def verifikasi(command, data):
             user, json.dumps(verified_status))
     except Exception as e:
         log.warning(e)
-        raise Exception(
+        edit_original_response(
+            interaction_token,
             'Verifikasi gagal! Token tidak valid atau sudah pernah digunakan.')
+        return
 
-    return {
-        'type': InteractionResponseType.CHANNEL_MESSAGE_WITH_SOURCE,
-        'data': {
-            'content': 'Akun terverifikasi! selamat datang di Discord UpKoding.'
-        }
-    }
+    edit_original_response(
+        interaction_token,
+        'Akun terverifikasi! selamat datang di Discord UpKoding.')
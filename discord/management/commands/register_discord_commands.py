@@ -1,7 +1,7 @@
-import requests
 from django.core.management.base import BaseCommand, CommandError
 
-from discord.conf import COMMANDS_API_URL, BOT_REQUEST_HEADERS
+from discord.client import bot_client
+from discord.conf import APPLICATION_ID
 
 commands = [
     {
@@ -27,9 +27,7 @@ class Command(BaseCommand):
         for cmd in commands:
             name = cmd.get('name')
             try:
-                resp = requests.post(COMMANDS_API_URL,
-                                     headers=BOT_REQUEST_HEADERS, json=cmd)
-                resp.raise_for_status()
+                bot_client.create_command(APPLICATION_ID, cmd)
                 self.stdout.write(self.style.SUCCESS(
                     f'Command `{name}` registered.'))
             except Exception as e:
@@ -1,6 +1,8 @@
+from django.utils.html import escape
 from rest_framework import serializers
 
 from account.models import User
+from forum.managers import HEADLINE_START, HEADLINE_STOP
 from forum.models import (
     Reply,
     Topic,
@@ -39,6 +41,7 @@ class TopicSerializer(serializers.ModelSerializer):
 
 class ThreadSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    last_reply_user = UserSerializer(read_only=True)
     stats = serializers.DictField(source="get_stats", read_only=True)
 
     class Meta:
@@ -51,9 +54,30 @@ class ThreadSerializer(serializers.ModelSerializer):
             "topic",
             "description",
             "created",
+            "last_activity_at",
+            "reply_count",
+            "last_reply_user",
             "stats",
         ]
-        read_only_fields = ["slug"]
+        read_only_fields = ["slug", "last_activity_at", "reply_count"]
+
+
+class ThreadSearchSerializer(ThreadSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.SerializerMethodField()
+
+    class Meta(ThreadSerializer.Meta):
+        fields = ThreadSerializer.Meta.fields + ["rank", "headline"]
+
+    def get_headline(self, obj):
+        """
+        Snippet of the best match with matched words wrapped in <mark>,
+        the rest of the content is escaped.
+        """
+        headline = escape(obj.headline or "")
+        return headline.replace(HEADLINE_START, "<mark>").replace(
+            HEADLINE_STOP, "</mark>"
+        )
 
 
 class ParticipantSerializer(serializers.ModelSerializer):
@@ -11,6 +11,8 @@ from .views import (
     TopicDetail,
     ThreadList,
     ThreadDetail,
+    ThreadSearch,
+    ThreadView,
     UtilsViewSet,
 )
 
@@ -35,7 +37,9 @@ urlpatterns = [
     ),
     # threads
     path("threads/", ThreadList.as_view(), name="thread_list"),
+    path("threads/search/", ThreadSearch.as_view(), name="thread_search"),
     path("threads/<int:pk>/", ThreadDetail.as_view(), name="thread_detail"),
+    path("threads/<int:pk>/view/", ThreadView.as_view(), name="thread_view"),
     path(
         "threads/<int:content_id>/participants/",
         ParticipantList.as_view(content_class=Thread),
@@ -1,29 +1,193 @@
+import copy
+import hashlib
+
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Max
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import generics
 from rest_framework import viewsets
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
 from rest_framework.response import Response
 
-from upkoding.pagination import NewestIdFirstCursorPagination
+from upkoding.throttling import ScopedSlidingWindowThrottle, get_ident
+from upkoding.pagination import (
+    NewestIdFirstCursorPagination,
+    SearchScoreCursorPagination,
+    SelectableOrderingCursorPagination,
+)
 from projects.models import Project
 from forum.models import (
     Reply,
     Participant,
+    Stat,
     Topic,
     Thread,
+    ThreadRead,
 )
+from forum.api import fast
 from forum.api.serializers import (
     ReplySerializer,
     TopicSerializer,
     ThreadSerializer,
+    ThreadSearchSerializer,
     ParticipantSerializer,
 )
 
 from .permissions import IsOwnerOrReadOnly
 
+
+class PreloadMixin:
+    """
+    Hand the objects being serialized to `preload()` at once, mixins extend it
+    (calling `super()`) to load what their serializer fields need in bulk.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        if args and args[0] is not None:
+            many = kwargs.get("many")
+            objects = list(args[0]) if many else [args[0]]
+            self.preload(objects)
+            if many:
+                args = (objects,) + args[1:]
+        return super().get_serializer(*args, **kwargs)
+
+    def preload(self, objects):
+        pass
+
+
+class StatsMixin(PreloadMixin):
+    """
+    Load stats for every object being serialized in a single query,
+    instead of a query per object from `get_stats()`.
+    """
+
+    def preload(self, objects):
+        super().preload(objects)
+        Stat.load_for(objects)
+
+
+class ReplyTreeMixin(PreloadMixin):
+    """
+    Load child replies of every reply being serialized in a single query.
+    """
+
+    def preload(self, objects):
+        super().preload(objects)
+        Reply.load_replies(objects)
+
+
+class FastListMixin:
+    """
+    Read-only fast path for lists: GET lists `values(*fast_fields)` rows
+    turned into response dicts by `fast_serialize` (see `forum.api.fast`),
+    writes keep going through `serializer_class`.
+    """
+
+    fast_fields = None
+    fast_serialize = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == "GET":
+            return queryset.select_related(None).values(*self.fast_fields)
+        return queryset
+
+    def get_list_data(self, objects):
+        return self.fast_serialize(objects)
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET, responds `304 Not Modified` without serializing anything
+    when the client's `If-None-Match` / `If-Modified-Since` still matches.
+
+    Validators are computed from the objects in the response (the current cursor page
+    for lists): their ids and the latest `updated` of the objects, their stats
+    and whatever `get_last_modified_extra()` returns.
+    Lists only get an ETag: their latest `updated` goes backward when an object
+    leaves the page, `If-Modified-Since` alone can't tell.
+    Objects can be model instances or `values()` rows (see `FastListMixin`).
+    """
+
+    def get_last_modified_extra(self, ids):
+        return []
+
+    def get_validators(self, objects):
+        if objects and isinstance(objects[0], dict):
+            ids = [obj["id"] for obj in objects]
+            modified = [obj["updated"] for obj in objects]
+        else:
+            ids = [obj.pk for obj in objects]
+            modified = [obj.updated for obj in objects]
+        modified.append(Stat.last_updated_for_ids(self.get_queryset().model, ids))
+        modified += self.get_last_modified_extra(ids)
+        modified = [m for m in modified if m is not None]
+        last_modified = max(modified) if modified else None
+
+        paginator = getattr(self, "paginator", None)
+        key = [
+            self.request.get_full_path(),
+            self.request.user.pk,
+            ids,
+            getattr(paginator, "has_next", None),
+            getattr(paginator, "has_previous", None),
+            last_modified.isoformat() if last_modified else None,
+        ]
+        etag = quote_etag(hashlib.md5(repr(key).encode()).hexdigest())
+        return etag, last_modified
+
+    def conditional_response(self, objects, get_response, with_last_modified=True):
+        """
+        Returns 304 when `objects` unchanged, otherwise the response of `get_response()`.
+        """
+        etag, last_modified = self.get_validators(objects)
+        timestamp = None
+        if with_last_modified and last_modified:
+            timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(
+            self.request._request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = get_response()
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        # always revalidate
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def get_list_data(self, objects):
+        return self.get_serializer(objects, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = list(queryset) if page is None else page
+
+        def get_response():
+            data = self.get_list_data(objects)
+            if page is None:
+                return Response(data)
+            return self.get_paginated_response(data)
+
+        return self.conditional_response(objects, get_response, with_last_modified=False)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(
+            [instance], lambda: Response(self.get_serializer(instance).data)
+        )
+
+
 # Topic
-class TopicList(generics.ListAPIView):
+class TopicList(StatsMixin, generics.ListAPIView):
     queryset = Topic.objects.active()
     # we want newly created topic showing first
     serializer_class = TopicSerializer
@@ -31,25 +195,56 @@ class TopicList(generics.ListAPIView):
     filterset_fields = ["user", "user__username"]
 
 
-class TopicDetail(generics.RetrieveAPIView):
+class TopicDetail(ConditionalGetMixin, StatsMixin, generics.RetrieveAPIView):
     queryset = Topic.objects.active()
     serializer_class = TopicSerializer
 
 
 # Thread
-class ThreadList(generics.ListCreateAPIView):
-    queryset = Thread.objects.active()
-    serializer_class = ThreadSerializer
+class ThreadCursorPagination(SelectableOrderingCursorPagination):
     # we want newly created thread showing first
-    pagination_class = NewestIdFirstCursorPagination
+    ordering = "-id"
+    orderings = {
+        "newest": "-id",
+        # recently replied first
+        "active": ("-last_activity_at", "-id"),
+        # most replied first
+        "popular": ("-reply_count", "-id"),
+    }
+
+
+class ThreadList(
+    FastListMixin, ConditionalGetMixin, StatsMixin, generics.ListCreateAPIView
+):
+    queryset = Thread.objects.active().select_related("user", "last_reply_user")
+    serializer_class = ThreadSerializer
+    fast_fields = fast.THREAD_FIELDS
+    fast_serialize = staticmethod(fast.serialize_threads)
+    throttle_classes = [ScopedSlidingWindowThrottle]
+    throttle_scope = "forum_thread"
+    pagination_class = ThreadCursorPagination
     filterset_fields = ["topic", "user", "user__username"]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == "GET":
+            queryset = queryset.annotate(
+                unread_count=ThreadRead.unread_count_expression(self.request.user)
+            )
+        return queryset
+
+    def get_last_modified_extra(self, ids):
+        # unread counts change when the user reads a thread
+        return [ThreadRead.last_read_for(self.request.user, ids)]
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class ThreadDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Thread.objects.active()
+class ThreadDetail(
+    ConditionalGetMixin, StatsMixin, generics.RetrieveUpdateDestroyAPIView
+):
+    queryset = Thread.objects.active().select_related("user", "last_reply_user")
     serializer_class = ThreadSerializer
     permission_classes = [IsOwnerOrReadOnly]
 
@@ -59,18 +254,90 @@ class ThreadDetail(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
+class ThreadView(generics.GenericAPIView):
+    """
+    Count a view of the thread and mark it read for the current user, sent by the
+    discussion widget when a thread is opened.
+    `ThreadDetail` is also fetched for threads nobody opened (eg. pushed ones).
+    A viewer (user, session or client IP) counts once per `view_timeout` seconds.
+    """
+
+    queryset = Thread.objects.active()
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedSlidingWindowThrottle]
+    throttle_scope = "forum_thread_view"
+    view_timeout = 60 * 30
+
+    def get_viewer(self):
+        request = self.request
+        if not request.user.is_authenticated and request.session.session_key:
+            key = hashlib.md5(request.session.session_key.encode()).hexdigest()
+            return f"session:{key}"
+        return get_ident(request)
+
+    def post(self, request, *args, **kwargs):
+        instance = self.get_object()
+        key = f"forum_thread_viewed:{instance.pk}:{self.get_viewer()}"
+        if cache.add(key, 1, self.view_timeout):
+            instance.inc_view_count()
+        if request.user.is_authenticated:
+            ThreadRead.mark_read(request.user, instance)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ThreadSearch(StatsMixin, generics.ListAPIView):
+    """
+    Full text search over threads (and their replies).
+    Params:
+        - q: search text, supports web search syntax (eg. `"exact phrase" -excluded`).
+        - topic: topic id, search within a topic only.
+    """
+
+    serializer_class = ThreadSearchSerializer
+    pagination_class = SearchScoreCursorPagination
+
+    def get_queryset(self):
+        text = self.request.query_params.get("q", "").strip()
+        if not text:
+            return Thread.objects.none()
+
+        topic = self.request.query_params.get("topic")
+        if topic is not None and not topic.isdigit():
+            return Thread.objects.none()
+        return Thread.objects.search(text, topic=topic).select_related(
+            "user", "last_reply_user"
+        )
+
+
 # Reply
-class ReplyList(generics.ListCreateAPIView):
-    queryset = Reply.objects.active()
+class ReplyList(
+    FastListMixin,
+    ConditionalGetMixin,
+    ReplyTreeMixin,
+    StatsMixin,
+    generics.ListCreateAPIView,
+):
+    queryset = Reply.objects.active().select_related("user")
     serializer_class = ReplySerializer
     filterset_fields = ["thread", "user", "user__username", "parent", "level"]
+    fast_fields = fast.REPLY_FIELDS
+    fast_serialize = staticmethod(fast.serialize_replies)
+    throttle_classes = [ScopedSlidingWindowThrottle]
+    throttle_scope = "forum_reply"
+
+    def get_last_modified_extra(self, ids):
+        # child replies are part of the response too
+        children = Reply.objects.filter(parent__in=ids)
+        return [children.aggregate(last_updated=Max("updated"))["last_updated"]]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        reply = serializer.save(user=self.request.user)
+        # the author has seen the thread up to their own reply
+        ThreadRead.mark_read(self.request.user, reply.thread)
 
 
-class ReplyDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Reply.objects.active()
+class ReplyDetail(ReplyTreeMixin, StatsMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Reply.objects.active().select_related("user")
     serializer_class = ReplySerializer
     permission_classes = [IsOwnerOrReadOnly]
 
@@ -120,10 +387,86 @@ class ParticipantDetail(generics.RetrieveUpdateAPIView):
 
 
 # Utils
+def get_discussion_bootstrap(request, project):
+    """
+    Everything the discuss app needs on load, for `project`:
+        - topic (with stats), `None` when there's no discussion yet.
+        - first page of threads (with stats) and url of the next page.
+        - current user's subscription to the topic.
+    `request` is a Django `HttpRequest`, so this can be embedded in a regular page.
+    """
+    try:
+        topic = Topic.objects.get_for_project(project)
+    except Topic.DoesNotExist:
+        return {
+            "topic": None,
+            "threads": {"results": [], "next": None},
+            "subscription": None,
+        }
+
+    # first page, whatever the query string of the embedding page is.
+    page_request = copy.copy(request)
+    page_request.GET = QueryDict()
+    drf_request = Request(page_request)
+    paginator = ThreadCursorPagination()
+    threads = paginator.paginate_queryset(
+        Thread.objects.active()
+        .filter(topic=topic)
+        .values(*fast.THREAD_FIELDS)
+        .annotate(unread_count=ThreadRead.unread_count_expression(request.user)),
+        drf_request,
+    )
+    # next page comes from the thread list endpoint, not the current url.
+    paginator.base_url = request.build_absolute_uri(
+        reverse("forum:api:thread_list") + f"?topic={topic.pk}"
+    )
+    # topic stats are loaded along with the threads' by `serialize_threads()`
+    threads = fast.serialize_threads(threads, stats_of=[topic])
+
+    subscription = None
+    if request.user.is_authenticated:
+        participant = Participant.objects.filter(
+            content_type=topic.get_content_type(),
+            content_id=topic.pk,
+            user=request.user,
+        ).first()
+        if participant is not None:
+            subscription = {"id": participant.pk, "subscribed": participant.subscribed}
+
+    return {
+        "topic": TopicSerializer(topic).data,
+        "threads": {
+            "results": threads,
+            "next": paginator.get_next_link(),
+        },
+        "subscription": subscription,
+    }
+
+
 class UtilsViewSet(viewsets.ViewSet):
     def err_message(self, msg):
         return {"detail": msg}
 
+    @action(detail=False, methods=["get"], name="Discussion bootstrap for a project")
+    def bootstrap_for_project(self, request):
+        """
+        Topic, first page of threads and subscription state in a single request.
+        """
+        project_id = request.query_params.get("project")
+        if not project_id:
+            return Response(
+                self.err_message("Missing project in query params"),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            project = Project.objects.active().get(pk=project_id)
+        except (ObjectDoesNotExist, ValueError):
+            return Response(
+                self.err_message("Project does not exist"),
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(get_discussion_bootstrap(request._request, project))
+
     @action(detail=False, methods=["get"], name="Get Topic for a project")
     def get_topic_for_project(self, request):
         project_id = request.query_params.get("project")
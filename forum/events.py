@@ -8,6 +8,7 @@ from .models import (
     Thread,
     Reply,
     Participant,
+    Stat,
 )
 
 FROM = settings.DEFAULT_EMAIL_FROM
@@ -21,15 +22,18 @@ class OnThreadCreated:
         self.topic_content_object = self.topic.content_object
 
         with transaction.atomic():
-            # add creator as thread participant
-            self.instance.add_participant(self.user)
-
-            # add topic content owner to topic participant
-            # so we can notify them about new thread
-            self.topic.add_participant(self.topic_content_object.user)
+            # - add creator as thread participant
+            # - add topic content owner to topic participant
+            #   so we can notify them about new thread
+            Participant.add_many(
+                [
+                    (self.instance, self.user),
+                    (self.topic, self.topic_content_object.user),
+                ]
+            )
 
             # increment thread_count stat for instance's topic
-            self.topic.inc_thread_count()
+            Stat.inc_many([(self.topic, Stat.TYPE_THREAD_COUNT)])
 
         # send notification to Topic subscribers
         self.email_context = {
@@ -78,26 +82,37 @@ class OnReplyCreated:
             "topic_content_object": self.topic_content_object,
         }
 
+        # participants, stats and thread's reply columns are written in one query each,
+        # whatever number of objects involved, so locks are held as short as possible.
         if self.parent:
             with transaction.atomic():
                 # thread reply's reply: add creator as Participant for its parent reply.
-                self.parent.add_participant(self.user)
+                Participant.add_many([(self.parent, self.user)])
 
                 # update reply count
-                self.parent.inc_reply_count()
-                self.thread.inc_reply_count()
+                Stat.inc_many(
+                    [
+                        (self.parent, Stat.TYPE_REPLY_COUNT),
+                        (self.thread, Stat.TYPE_REPLY_COUNT),
+                    ]
+                )
+                self.thread.add_reply(reply)
 
             # send notifications to reply participants
             self.notify_new_reply_reply()
         else:
             with transaction.atomic():
                 # thread reply: add creator as thread participant as well as reply participants
-                self.instance.add_participant(self.user)
-                self.thread = self.instance.thread
-                self.thread.add_participant(self.user)
+                Participant.add_many(
+                    [
+                        (self.instance, self.user),
+                        (self.thread, self.user),
+                    ]
+                )
 
                 # update reply count
-                self.thread.inc_reply_count()
+                Stat.inc_many([(self.thread, Stat.TYPE_REPLY_COUNT)])
+                self.thread.add_reply(reply)
 
             # send notifications to thread participants
             self.notify_new_reply()
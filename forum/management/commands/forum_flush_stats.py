@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from forum import stat_buffer
+from forum.models import Stat
+
+
+class Command(BaseCommand):
+    help = 'Write buffered forum stats (eg. view count) to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep flushing every --interval seconds')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds between flushes when --loop is used')
+
+    def handle(self, *args, **options):
+        while True:
+            self.flush()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def flush(self):
+        flushed = Stat.flush_buffer()
+        if flushed is None:
+            self.stdout.write(self.style.WARNING(
+                'Another flush is running, skipped.'))
+            return
+
+        metrics = stat_buffer.metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] {flushed} increment(s) flushed. '
+            f'Total buffered: {metrics["buffered"]}, '
+            f'flushed: {metrics["flushed"]}, '
+            f'pending slots: {metrics["pending_slots"]}'))
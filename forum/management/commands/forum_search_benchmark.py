@@ -0,0 +1,135 @@
+import random
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from account.models import User
+from forum.managers import THREAD_SEARCH_VECTORS, REPLY_SEARCH_VECTORS
+from forum.models import Topic, Thread, Reply
+
+WORDS = (
+    'django python javascript golang rust docker kubernetes postgres redis '
+    'query index cache deploy error exception bug fix test function class '
+    'variable loop array string integer server client request response api '
+    'project solusi tanya jawab kode program belajar pemula lanjut cara '
+    'kenapa bagaimana tidak bisa jalan gagal berhasil database tabel'
+).split()
+
+BENCHMARK_TOPIC_SLUG = 'search-benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark forum full text search (optionally seeding a benchmark topic first)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Number of replies to create in the benchmark topic')
+        parser.add_argument('--replies-per-thread', type=int, default=20)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--user', default=None,
+                            help='Username owning seeded content (default: first superuser)')
+        parser.add_argument('--query', action='append', default=None,
+                            help='Search text, can be used multiple times')
+        parser.add_argument('--runs', type=int, default=20,
+                            help='Number of runs for every query')
+        parser.add_argument('--scoped', action='store_true',
+                            help='Search within the benchmark topic only')
+        parser.add_argument('--explain', action='store_true',
+                            help='Print query plan of the first page')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the benchmark topic and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = Topic.objects.filter(slug=BENCHMARK_TOPIC_SLUG).delete()
+            self.stdout.write(self.style.SUCCESS(f'[OK] {deleted} object(s) deleted.'))
+            return
+
+        if options['seed']:
+            self.seed(options)
+
+        topic = None
+        if options['scoped']:
+            topic = Topic.objects.filter(slug=BENCHMARK_TOPIC_SLUG).first()
+            if topic is None:
+                raise CommandError('Benchmark topic not found, run with --seed first.')
+
+        self.stdout.write(
+            f'{Thread.objects.count()} thread(s), {Reply.objects.count()} reply(ies)')
+        for text in options['query'] or ['django error', 'cara deploy docker', '"database tabel"']:
+            self.run_query(text, topic, options['runs'], options['explain'])
+
+    def run_query(self, text, topic, runs, explain):
+        queryset = Thread.objects.search(text, topic=topic).order_by('-score', '-id')
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            page = list(queryset[:20])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        timings.sort()
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] "{text}": {len(page)} result(s) on first page, '
+            f'p50 {statistics.median(timings):.1f}ms, p95 {p95:.1f}ms, max {timings[-1]:.1f}ms'))
+
+        if explain:
+            sql, params = queryset[:20].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                for row in cursor.fetchall():
+                    self.stdout.write(f'    {row[0]}')
+
+    def seed(self, options):
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to own the seeded content, use --user.')
+
+        topic, _ = Topic.objects.get_or_create(
+            slug=BENCHMARK_TOPIC_SLUG,
+            defaults={
+                'title': 'Search Benchmark',
+                'user': user,
+                'content_type': ContentType.objects.get_for_model(Topic),
+                'content_id': 0,
+                'status': Topic.STATUS_INACTIVE,
+            })
+
+        total = options['seed']
+        per_thread = options['replies_per_thread']
+        chunk_size = options['chunk_size']
+        started = time.monotonic()
+        created = 0
+        while created < total:
+            size = min(chunk_size, total - created)
+            threads = Thread.objects.bulk_create([
+                Thread(topic=topic, user=user, title=self.sentence(6),
+                       description=self.sentence(60))
+                for _ in range(max(size // per_thread, 1))
+            ])
+            replies = Reply.objects.bulk_create([
+                Reply(thread=random.choice(threads), user=user,
+                      message=self.sentence(40), level=0)
+                for _ in range(size)
+            ])
+            # bulk_create() skips save(), compute the vectors for this chunk.
+            Thread.objects.filter(pk__in=[t.pk for t in threads]) \
+                .update(search_vector=THREAD_SEARCH_VECTORS)
+            Reply.objects.filter(pk__in=[r.pk for r in replies]) \
+                .update(search_vector=REPLY_SEARCH_VECTORS)
+
+            created += size
+            rate = created / (time.monotonic() - started)
+            self.stdout.write(f'{created}/{total} reply(ies) created, {rate:.0f} rows/s')
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Thread._meta.db_table}, {Reply._meta.db_table}')
+
+    def sentence(self, length):
+        return ' '.join(random.choices(WORDS, k=length))
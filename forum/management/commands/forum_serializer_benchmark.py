@@ -0,0 +1,114 @@
+import statistics
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from account.models import User
+from forum.api import fast
+from forum.api.serializers import ReplySerializer
+from forum.models import Topic, Thread, Reply, Stat
+from upkoding.renderers import ORJSONRenderer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare reply list serialization: DRF serializers vs values() fast path, per 100 replies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replies', type=int, default=100,
+                            help='Number of replies serialized per run')
+        parser.add_argument('--sub-replies', type=int, default=2,
+                            help='Child replies of every reply')
+        parser.add_argument('--users', type=int, default=10,
+                            help='Number of distinct authors among seeded replies')
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # seeded content is rolled back once measured.
+        try:
+            with transaction.atomic():
+                thread = self.seed(options)
+                self.run(thread, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        users = list(User.objects.order_by('pk')[:options['users']])
+        if not users:
+            raise CommandError('No user to own the seeded content.')
+
+        topic = Topic.objects.create(
+            title='Serializer Benchmark', user=users[0],
+            content_type=ContentType.objects.get_for_model(Topic), content_id=0,
+            status=Topic.STATUS_INACTIVE)
+        # bulk_create() skips signals (notifications, realtime push).
+        thread, = Thread.objects.bulk_create([
+            Thread(topic=topic, user=users[0], title='Serializer Benchmark', description='-')])
+        replies = Reply.objects.bulk_create([
+            Reply(thread=thread, user=users[i % len(users)], level=0,
+                  message=f'reply {i} ' * 20)
+            for i in range(options['replies'])
+        ])
+        Reply.objects.bulk_create([
+            Reply(thread=thread, parent=reply, user=users[(i + j) % len(users)], level=1,
+                  message=f'sub reply {j} ' * 10)
+            for i, reply in enumerate(replies)
+            for j in range(options['sub_replies'])
+        ])
+        Stat.inc_many([(reply, Stat.TYPE_REPLY_COUNT) for reply in replies])
+        return thread
+
+    def run(self, thread, options):
+        replies = Reply.objects.active().filter(thread=thread, level=0)
+
+        def serializer():
+            objects = list(replies.select_related('user'))
+            Stat.load_for(objects)
+            Reply.load_replies(objects)
+            return ReplySerializer(objects, many=True).data
+
+        def fast_path():
+            return fast.serialize_replies(replies.values(*fast.REPLY_FIELDS))
+
+        # warm up, and make sure both produce the same output.
+        expected = JSONRenderer().render(serializer())
+        if JSONRenderer().render(fast_path()) != expected:
+            raise CommandError('Fast path output differs from ReplySerializer output.')
+
+        scale = 100 / options['replies']
+        self.stdout.write(
+            f"{options['replies']} reply(ies) with {options['sub_replies']} sub reply(ies) each, "
+            f"{options['runs']} run(s), timings per 100 replies")
+        data = None
+        for name, build in (('ReplySerializer', serializer), ('fast path', fast_path)):
+            with CaptureQueriesContext(connection) as queries:
+                data = build()
+            timings = self.measure(build, options['runs'])
+            self.report(name, timings, scale, f', {len(queries)} queries')
+
+        for name, renderer in (('JSONRenderer', JSONRenderer()), ('ORJSONRenderer', ORJSONRenderer())):
+            timings = self.measure(lambda: renderer.render(data), options['runs'])
+            self.report(name, timings, scale)
+
+    def measure(self, func, runs):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def report(self, name, timings, scale, extra=''):
+        timings = sorted(t * scale for t in timings)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] {name}: p50 {statistics.median(timings):.2f}ms, '
+            f'p95 {p95:.2f}ms{extra}'))
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import re
+import statistics
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.realtime import publish, is_enabled
+
+CONNECTED_PID = re.compile(rb': connected pid=(\d+)')
+
+
+class Command(BaseCommand):
+    help = 'Load test forum realtime streams: hold many connections and measure event delivery'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8001',
+                            help='Base url of the stream service (upkoding.asgi)')
+        parser.add_argument('--stream', default='threads/1',
+                            help='Stream to subscribe, eg. threads/1 or topics/1')
+        parser.add_argument('--connections', type=int, default=1000)
+        parser.add_argument('--ramp', type=int, default=200,
+                            help='New connections per second')
+        parser.add_argument('--events', type=int, default=20,
+                            help='Number of events published once every connection is open')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Seconds between published events')
+
+    def handle(self, *args, **options):
+        if not is_enabled():
+            raise CommandError('Streams need Postgres (LISTEN/NOTIFY).')
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        url = urlsplit(options['url'])
+        path = f"/forum/stream/{options['stream'].strip('/')}/"
+        stream = options['stream'].strip('/').replace('s/', ':', 1)
+        self.latencies = []
+        self.received = Counter()
+        self.pids = Counter()
+        self.failed = 0
+
+        started = time.monotonic()
+        clients = []
+        for i in range(options['connections']):
+            clients.append(asyncio.ensure_future(
+                self.client(i, url.hostname, url.port or 80, path)))
+            if options['ramp']:
+                await asyncio.sleep(1 / options['ramp'])
+        # let the last ones connect
+        await asyncio.sleep(1)
+        held = sum(self.pids.values())
+        self.stdout.write(
+            f'{held}/{options["connections"]} connection(s) held '
+            f'in {time.monotonic() - started:.1f}s, {self.failed} failed')
+        for pid, count in sorted(self.pids.items()):
+            self.stdout.write(f'    worker pid={pid}: {count} connection(s)')
+
+        for seq in range(options['events']):
+            await sync_to_async(publish)({
+                'type': 'loadtest',
+                'streams': [stream],
+                'data': {'seq': seq, 'sent': time.time()},
+            })
+            await asyncio.sleep(options['interval'])
+        await asyncio.sleep(1)
+
+        for client in clients:
+            client.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+
+        expected = held * options['events']
+        delivered = sum(self.received.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] {delivered}/{expected} event(s) delivered'))
+        if self.latencies:
+            self.latencies.sort()
+            p95 = self.latencies[max(int(len(self.latencies) * 0.95) - 1, 0)]
+            self.stdout.write(self.style.SUCCESS(
+                f'[OK] latency p50 {statistics.median(self.latencies):.1f}ms, '
+                f'p95 {p95:.1f}ms, max {self.latencies[-1]:.1f}ms'))
+
+    async def client(self, i, host, port, path):
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            self.failed += 1
+            return
+
+        try:
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                match = CONNECTED_PID.search(line)
+                if match:
+                    self.pids[match.group(1).decode()] += 1
+                elif line.startswith(b'data: ') and b'"loadtest"' in line:
+                    event = json.loads(line[len(b'data: '):])
+                    self.received[i] += 1
+                    self.latencies.append((time.time() - event['data']['sent']) * 1000)
+        except (OSError, ValueError):
+            self.failed += 1
+        finally:
+            writer.close()
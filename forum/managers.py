@@ -1,5 +1,24 @@
 from django.db import models
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+
+THREAD_SEARCH_VECTORS = SearchVector("title", weight="A") + SearchVector(
+    "description", weight="B"
+)
+REPLY_SEARCH_VECTORS = SearchVector("message", weight="C")
+
+# ts_headline() markers, replaced with <mark> after the snippet is escaped.
+HEADLINE_START = "\x02"
+HEADLINE_STOP = "\x03"
+# rank is a float, it's scaled to an integer so it can be used as pagination cursor.
+SEARCH_SCORE_SCALE = 1000000
 
 
 class TopicManager(models.Manager):
@@ -43,6 +62,69 @@ class ThreadManager(models.Manager):
         """
         return self.filter(status=self.model.STATUS_ACTIVE)
 
+    def search(self, text, topic=None):
+        """
+        Full Text Search over active threads and their replies.
+        Threads are ranked by the best match between the thread itself and its replies,
+        each annotated with `score` and `headline` (highlighted snippet).
+        Usage:
+            `Thread.objects.search('django', topic=topic)`
+        """
+        # to avoid circular dependency
+        from forum.models import Reply
+
+        query = SearchQuery(text, search_type="websearch")
+        threads = self.active()
+        replies = Reply.objects.active().filter(search_vector=query)
+        matched_replies = replies
+        if topic is not None:
+            threads = threads.filter(topic=topic)
+            matched_replies = replies.filter(thread__topic=topic)
+
+        # best matching reply of each thread
+        best_reply = (
+            replies.filter(thread=OuterRef("pk"))
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank", "pk")
+        )
+        reply_headline = best_reply.annotate(
+            headline=SearchHeadline(
+                "message",
+                query,
+                start_sel=HEADLINE_START,
+                stop_sel=HEADLINE_STOP,
+                max_fragments=2,
+            )
+        ).values("headline")[:1]
+        thread_headline = SearchHeadline(
+            "description",
+            query,
+            start_sel=HEADLINE_START,
+            stop_sel=HEADLINE_STOP,
+            max_fragments=2,
+        )
+
+        # matching replies are looked up once (GIN index) instead of once per thread.
+        return (
+            threads.defer("search_vector")
+            .filter(
+                Q(search_vector=query) | Q(pk__in=matched_replies.values("thread_id"))
+            )
+            .annotate(
+                rank=Greatest(
+                    SearchRank(F("search_vector"), query),
+                    Coalesce(Subquery(best_reply.values("rank")[:1]), Value(0.0)),
+                )
+            )
+            .annotate(
+                score=Cast(F("rank") * SEARCH_SCORE_SCALE, models.IntegerField()),
+                headline=Case(
+                    When(search_vector=query, then=thread_headline),
+                    default=Subquery(reply_headline),
+                ),
+            )
+        )
+
 
 class ReplyManager(models.Manager):
     def active(self):
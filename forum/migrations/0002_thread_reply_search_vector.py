@@ -0,0 +1,56 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def populate_search_vector(apps, schema_editor):
+    from forum.managers import THREAD_SEARCH_VECTORS, REPLY_SEARCH_VECTORS
+
+    apps.get_model('forum', 'Thread').objects.update(search_vector=THREAD_SEARCH_VECTORS)
+    apps.get_model('forum', 'Reply').objects.update(search_vector=REPLY_SEARCH_VECTORS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reply',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='reply',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Inactive'), (1, 'Active'), (3, 'Deleted')], db_index=True, default=1, verbose_name='Status'),
+        ),
+        migrations.AlterField(
+            model_name='thread',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Inactive'), (1, 'Active'), (3, 'Deleted')], db_index=True, default=1, verbose_name='Status'),
+        ),
+        migrations.AlterField(
+            model_name='topic',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Inactive'), (1, 'Active'), (3, 'Deleted')], db_index=True, default=1, verbose_name='Status'),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reply',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='forum_reply_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='forum_thread_search_idx'),
+        ),
+    ]
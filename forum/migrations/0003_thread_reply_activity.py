@@ -0,0 +1,58 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:25
+
+from django.conf import settings
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_reply_activity(apps, schema_editor):
+    Thread = apps.get_model('forum', 'Thread')
+    Reply = apps.get_model('forum', 'Reply')
+
+    # status=1: active
+    replies = Reply.objects.filter(thread=OuterRef('pk'), status=1)
+    last_reply = replies.order_by('-created', '-pk')
+    reply_count = replies.order_by().values('thread').annotate(count=Count('pk')).values('count')
+    Thread.objects.update(
+        last_activity_at=Coalesce(Subquery(last_reply.values('created')[:1]), F('created')),
+        last_reply_user=Subquery(last_reply.values('user')[:1]),
+        reply_count=Coalesce(Subquery(reply_count), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('forum', '0002_thread_reply_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='last_reply_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='thread',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_reply_activity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['topic', 'status', '-last_activity_at', '-id'], name='forum_thread_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['topic', 'status', '-reply_count', '-id'], name='forum_thread_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.6 on 2026-10-19 16:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('forum', '0003_thread_reply_activity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reply',
+            index=models.Index(condition=models.Q(status=1), fields=['thread', 'id'], name='forum_reply_active_idx'),
+        ),
+        migrations.CreateModel(
+            name='ThreadRead',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_reply_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('thread', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='forum.thread')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='threadread',
+            constraint=models.UniqueConstraint(fields=('user', 'thread'), name='forum_threadread_unique_user_thread'),
+        ),
+    ]
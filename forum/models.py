@@ -1,15 +1,29 @@
 import uuid
+from collections import defaultdict
 from django.db import models
+from django.db import connection
 from django.db import transaction
+from django.db.models.functions import Coalesce
 from django.template.defaultfilters import slugify
 from django.urls import reverse
+from django.utils.timezone import now
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 from sorl.thumbnail import ImageField, get_thumbnail
 
 from account.models import User
-from .managers import TopicManager, ReplyManager
+from upkoding.jobs import defer
+from . import stat_buffer
+from .managers import (
+    TopicManager,
+    ThreadManager,
+    ReplyManager,
+    THREAD_SEARCH_VECTORS,
+    REPLY_SEARCH_VECTORS,
+)
 
 
 class Participant(models.Model):
@@ -50,6 +64,24 @@ class Participant(models.Model):
         )
         return queryset if exclude_user is None else queryset.exclude(user=exclude_user)
 
+    @classmethod
+    def add_many(cls, participants):
+        """
+        Add `participants`, a list of `(obj, user)`, in a single query.
+        Existing participants are left untouched (`ON CONFLICT DO NOTHING`).
+        """
+        cls.objects.bulk_create(
+            [
+                cls(
+                    content_type=obj.get_content_type(),
+                    content_id=obj.pk,
+                    user=user,
+                )
+                for obj, user in participants
+            ],
+            ignore_conflicts=True,
+        )
+
 
 class Stat(models.Model):
     """
@@ -87,15 +119,212 @@ class Stat(models.Model):
             )
         ]
 
+    # hot stats, buffered in cache and written by `flush_buffer()`
+    # (when the cache is shared, see `stat_buffer.is_enabled()`).
+    BUFFERED_TYPES = [TYPE_VIEW_COUNT]
+
     @classmethod
     def inc_value(cls, obj, stat_type: int):
         content_type = obj.get_content_type()
+        if stat_type in cls.BUFFERED_TYPES and stat_buffer.is_enabled():
+            stat_buffer.add(content_type.pk, obj.id, stat_type)
+            cls.schedule_flush()
+            return
+
         stat, _ = cls.objects.get_or_create(
             content_type=content_type, content_id=obj.id, stat_type=stat_type
         )
         stat.value = models.F("value") + 1
         stat.save()
 
+    @classmethod
+    def inc_many(cls, stats):
+        """
+        Increment `stats`, a list of `(obj, stat_type)`, in a single query
+        (buffered types go to the buffer instead).
+        """
+        increments = defaultdict(int)
+        buffered = stat_buffer.is_enabled()
+        scheduled = False
+        for obj, stat_type in stats:
+            key = (obj.get_content_type().pk, obj.pk, stat_type)
+            if buffered and stat_type in cls.BUFFERED_TYPES:
+                stat_buffer.add(*key)
+                scheduled = True
+            else:
+                increments[key] += 1
+            # loaded stats are outdated now
+            obj.__dict__.pop("_stats", None)
+        cls.bulk_inc(increments)
+        if scheduled:
+            cls.schedule_flush()
+
+    @classmethod
+    def bulk_inc(cls, increments):
+        """
+        Add values of `increments`, `{(content_type_id, content_id, stat_type): value}`,
+        creating missing stats, in a single `INSERT ... ON CONFLICT DO UPDATE` query.
+        """
+        if not increments:
+            return
+
+        table = cls._meta.db_table
+        rows = []
+        params = []
+        updated = now()
+        # same order for every writer, so concurrent upserts can't deadlock.
+        for (content_type_id, content_id, stat_type), value in sorted(
+            increments.items()
+        ):
+            rows.append("(%s, %s, %s, %s, %s, %s)")
+            params += [content_type_id, content_id, stat_type, value, updated, updated]
+
+        sql = (
+            f"INSERT INTO {table} "
+            "(content_type_id, content_id, stat_type, value, created, updated) "
+            f"VALUES {', '.join(rows)} "
+            "ON CONFLICT (content_type_id, content_id, stat_type) "
+            f"DO UPDATE SET value = {table}.value + EXCLUDED.value, updated = EXCLUDED.updated"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @classmethod
+    def schedule_flush(cls):
+        """
+        Flush the buffer in background when due, so buffered stats reach the
+        database without a `forum_flush_stats` worker.
+        """
+        if stat_buffer.flush_due():
+            defer(cls.flush_buffer)
+
+    @classmethod
+    def flush_buffer(cls):
+        """
+        Write buffered stats to the database, returns the number of increments written
+        or `None` when another flush is running.
+        """
+        increments = stat_buffer.drain()
+        if increments is None:
+            return None
+        try:
+            cls.bulk_inc(increments)
+        except Exception:
+            stat_buffer.restore(increments)
+            raise
+        flushed = sum(increments.values())
+        stat_buffer.mark_flushed(flushed)
+        return flushed
+
+    @classmethod
+    def _group_by_content(cls, objects):
+        """
+        Returns `{content_type_id: (stat_types, [content_id, ...])}` of `objects`.
+        """
+        groups = {}
+        for obj in objects:
+            content_type_id = obj.get_content_type().pk
+            groups.setdefault(content_type_id, (obj.stat_types, []))[1].append(obj.pk)
+        return groups
+
+    @classmethod
+    def _group_by_model(cls, model, ids):
+        return {model.get_content_type().pk: (model.stat_types, list(ids))} if ids else {}
+
+    @classmethod
+    def _stats_condition(cls, groups):
+        condition = models.Q()
+        for content_type_id, (stat_types, ids) in groups.items():
+            condition |= models.Q(
+                content_type_id=content_type_id,
+                content_id__in=ids,
+                stat_type__in=stat_types,
+            )
+        return condition
+
+    @classmethod
+    def _fetch(cls, groups):
+        """
+        Returns `{(content_type_id, content_id): {stat_name: value}}` of `groups`
+        in a single query, including buffered values not flushed yet
+        (so users see their own views).
+        """
+        stats = defaultdict(dict)
+        if not groups:
+            return stats
+
+        types = dict(cls.TYPES)
+        for stat in cls.objects.filter(cls._stats_condition(groups)).values_list(
+            "content_type_id", "content_id", "stat_type", "value"
+        ):
+            content_type_id, content_id, stat_type, value = stat
+            stats[(content_type_id, content_id)][types[stat_type]] = value
+
+        buffered = [
+            (content_type_id, content_id, stat_type)
+            for content_type_id, (stat_types, ids) in groups.items()
+            for content_id in ids
+            for stat_type in stat_types
+            if stat_type in cls.BUFFERED_TYPES
+        ]
+        for (content_type_id, content_id, stat_type), value in stat_buffer.pending(
+            buffered
+        ).items():
+            content_stats = stats[(content_type_id, content_id)]
+            name = types[stat_type]
+            content_stats[name] = content_stats.get(name, 0) + value
+        return stats
+
+    @classmethod
+    def _last_updated(cls, groups):
+        if not groups:
+            return None
+        return (
+            cls.objects.filter(cls._stats_condition(groups))
+            .aggregate(last_updated=models.Max("updated"))
+            .get("last_updated")
+        )
+
+    @classmethod
+    def last_updated_for(cls, objects):
+        """
+        Returns the latest `updated` among stats of `objects`, in a single query.
+        """
+        return cls._last_updated(cls._group_by_content(objects))
+
+    @classmethod
+    def last_updated_for_ids(cls, model, ids):
+        """
+        Same as `last_updated_for()`, for `ids` of `model` objects.
+        """
+        return cls._last_updated(cls._group_by_model(model, ids))
+
+    @classmethod
+    def load_for(cls, objects):
+        """
+        Load stats of `objects` (any model using `StatMixin`, can be mixed) in a single query
+        and attach them to each object, so `obj.get_stats()` doesn't hit the database.
+        """
+        stats = cls._fetch(cls._group_by_content(objects))
+        for obj in objects:
+            obj._stats = stats.get((obj.get_content_type().pk, obj.pk), {})
+        return objects
+
+    @classmethod
+    def values_for(cls, model, ids, objects=()):
+        """
+        Returns `{id: {stat_name: value}}` for `ids` of `model` objects, in a single query,
+        along with stats of `objects` loaded like `load_for()` does.
+        """
+        groups = cls._group_by_content(objects)
+        for content_type_id, (stat_types, model_ids) in cls._group_by_model(model, ids).items():
+            groups.setdefault(content_type_id, (stat_types, []))[1].extend(model_ids)
+        stats = cls._fetch(groups)
+        for obj in objects:
+            obj._stats = stats.get((obj.get_content_type().pk, obj.pk), {})
+        content_type_id = model.get_content_type().pk
+        return {pk: stats.get((content_type_id, pk), {}) for pk in ids}
+
 
 class ContentTypeMixin:
     @classmethod
@@ -117,6 +346,8 @@ class StatMixin(ContentTypeMixin):
 
     def inc_stat(self, stat_type: int):
         Stat.inc_value(self, stat_type)
+        # loaded stats are outdated now
+        self.__dict__.pop("_stats", None)
 
     def inc_thread_count(self):
         self.inc_stat(Stat.TYPE_THREAD_COUNT)
@@ -131,13 +362,23 @@ class StatMixin(ContentTypeMixin):
         self.inc_stat(Stat.TYPE_LIKE_COUNT)
 
     def get_stats(self):
-        content_type = self.__class__.get_content_type()
-        stats = Stat.objects.filter(
-            content_type=content_type,
-            content_id=self.pk,
-            stat_type__in=self.stat_types,
-        )
-        return {stat.get_stat_type_display(): stat.value for stat in stats}
+        if not hasattr(self, "_stats"):
+            Stat.load_for([self])
+        return self._stats
+
+
+def save_search_vector(instance, vectors, fields, save, *args, **kwargs):
+    """
+    Save `instance` keeping its `search_vector` up to date.
+    The vector is computed by the database from the saved columns of `fields`,
+    with a follow-up UPDATE: within the same statement it would be computed from
+    the previous values of the row.
+    """
+    save(*args, **kwargs)
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not set(update_fields) & {"search_vector", *fields}:
+        return
+    instance.__class__.objects.filter(pk=instance.pk).update(search_vector=vectors)
 
 
 def topic_image(instance, filename):
@@ -249,10 +490,32 @@ class Thread(models.Model, StatMixin, ParticipantMixin):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
-    objects = TopicManager()
+    # denormalized from replies, maintained by `add_reply()`
+    last_activity_at = models.DateTimeField(default=now)
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_user = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+
+    # full text search
+    search_vector = SearchVectorField(null=True, blank=True)
+
+    objects = ThreadManager()
 
     class Meta:
         ordering = ["-pk"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="forum_thread_search_idx"),
+            # `?ordering=active` and `?ordering=popular` within a topic
+            models.Index(
+                fields=["topic", "status", "-last_activity_at", "-id"],
+                name="forum_thread_active_idx",
+            ),
+            models.Index(
+                fields=["topic", "status", "-reply_count", "-id"],
+                name="forum_thread_popular_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -262,13 +525,26 @@ class Thread(models.Model, StatMixin, ParticipantMixin):
         if not self.slug:
             self.slug = slugify(self.title)
 
-        super().save(*args, **kwargs)
+        save_search_vector(
+            self, THREAD_SEARCH_VECTORS, ["title", "description"], super().save,
+            *args, **kwargs
+        )
 
     def get_absolute_url(self):
         return reverse(
             "forum:thread_detail", args=[self.topic.slug, self.slug, self.pk]
         )
 
+    def add_reply(self, reply):
+        """
+        Update denormalized reply columns, in a single query.
+        """
+        Thread.objects.filter(pk=self.pk).update(
+            reply_count=models.F("reply_count") + 1,
+            last_activity_at=reply.created,
+            last_reply_user_id=reply.user_id,
+        )
+
 
 class Reply(models.Model, StatMixin, ParticipantMixin):
     # available stats for Reply
@@ -301,16 +577,151 @@ class Reply(models.Model, StatMixin, ParticipantMixin):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    # full text search
+    search_vector = SearchVectorField(null=True, blank=True)
+
     objects = ReplyManager()
 
     class Meta:
         ordering = ["pk"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="forum_reply_search_idx"),
+            # replies after a read marker (see `ThreadRead.unread_count_expression()`)
+            models.Index(
+                fields=["thread", "id"],
+                name="forum_reply_active_idx",
+                condition=models.Q(status=1),
+            ),
+        ]
 
     def __str__(self):
         return f"(id={self.pk}, lvl={self.level}) {self.message}"
 
+    def save(self, *args, **kwargs):
+        save_search_vector(
+            self, REPLY_SEARCH_VECTORS, ["message"], super().save, *args, **kwargs
+        )
+
     def owned_by(self, user):
         return self.user == user
 
     def get_replies(self):
+        if hasattr(self, "_replies"):
+            return self._replies
         return Reply.objects.active().filter(parent=self)
+
+    @classmethod
+    def load_replies(cls, replies):
+        """
+        Load active child replies of `replies` (with their user) in a single query
+        and attach them, so `reply.get_replies()` doesn't hit the database.
+        Replies written by the same user share the user instance,
+        so things like avatar only resolved once.
+        """
+        parents = {}
+        for reply in replies:
+            reply._replies = []
+            if reply.level < cls.MAX_LEVEL:
+                parents[reply.pk] = reply
+
+        children = []
+        if parents:
+            children = list(
+                cls.objects.active()
+                .select_related("user")
+                .filter(parent_id__in=list(parents))
+            )
+
+        users = {}
+        for reply in list(replies) + children:
+            reply.user = users.setdefault(reply.user_id, reply.user)
+        for child in children:
+            parents[child.parent_id]._replies.append(child)
+        return replies
+
+
+class ThreadRead(models.Model):
+    """
+    Read marker of a thread for a user: the last reply seen, unread replies are the
+    active ones after it (so deleted replies are never counted).
+    Moved when the user opens the thread or replies to it.
+    """
+
+    # leading column of the unique constraint, no separate index needed.
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, db_index=False, related_name="+"
+    )
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE, related_name="+")
+    last_reply_id = models.PositiveIntegerField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "thread"],
+                name="forum_threadread_unique_user_thread",
+            )
+        ]
+
+    def __str__(self):
+        return f"user={self.user_id} thread={self.thread_id} reply={self.last_reply_id}"
+
+    @classmethod
+    def mark_read(cls, user, thread):
+        """
+        Move `user`'s marker of `thread` to its latest reply, in a single
+        `INSERT ... ON CONFLICT DO UPDATE` query. Markers never move backward.
+        """
+        table = cls._meta.db_table
+        thread_table = Thread._meta.db_table
+        reply_table = Reply._meta.db_table
+        sql = (
+            f"INSERT INTO {table} (user_id, thread_id, last_reply_id, updated) "
+            f"SELECT %s, t.id, (SELECT MAX(r.id) FROM {reply_table} r WHERE r.thread_id = t.id), "
+            f"%s FROM {thread_table} t WHERE t.id = %s "
+            "ON CONFLICT (user_id, thread_id) DO UPDATE SET "
+            f"last_reply_id = GREATEST({table}.last_reply_id, EXCLUDED.last_reply_id), "
+            "updated = EXCLUDED.updated"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, now(), thread.pk])
+
+    @classmethod
+    def unread_count_expression(cls, user):
+        """
+        Annotation for `Thread` querysets: number of replies `user` hasn't seen,
+        computed by the database along with the threads. `None` for anonymous users.
+        """
+        if not user.is_authenticated:
+            return models.Value(None, output_field=models.IntegerField())
+
+        last_read = cls.objects.filter(
+            user=user, thread=models.OuterRef(models.OuterRef("pk"))
+        ).values("last_reply_id")[:1]
+        unread = (
+            Reply.objects.active()
+            .filter(
+                thread=models.OuterRef("pk"),
+                pk__gt=Coalesce(models.Subquery(last_read), 0),
+            )
+            .order_by()
+            .values("thread")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        )
+        return Coalesce(
+            models.Subquery(unread, output_field=models.IntegerField()), 0
+        )
+
+    @classmethod
+    def last_read_for(cls, user, thread_ids):
+        """
+        Returns the latest `updated` among `user`'s markers of `thread_ids`.
+        """
+        if not user.is_authenticated or not thread_ids:
+            return None
+        return (
+            cls.objects.filter(user=user, thread_id__in=thread_ids)
+            .aggregate(last_updated=models.Max("updated"))
+            .get("last_updated")
+        )
@@ -0,0 +1,310 @@
+"""
+Realtime push of forum deltas (new threads and replies) to the discuss app.
+
+Writes publish events with Postgres `NOTIFY` (delivered when the transaction commits),
+every ASGI worker holds a single `LISTEN` connection and fans events out to the
+Server-Sent Events streams it serves:
+    /forum/stream/topics/<id>/   new threads of a topic
+    /forum/stream/threads/<id>/  new replies of a thread
+
+The stream app is served by `upkoding.asgi`, see there on how to run it.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+
+from django.db import connection, connections, transaction
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "forum_events"
+# NOTIFY payload must be shorter than 8000 bytes, bigger events are sent without `data`
+# and the client fetches the object from the API.
+MAX_PAYLOAD_SIZE = 7900
+
+STREAM_PATH = re.compile(r"^/forum/stream/(?P<kind>topic|thread)s/(?P<pk>\d+)/$")
+# comment sent to idle streams, keeps proxies from closing the connection.
+KEEPALIVE_INTERVAL = 15
+# client reconnect delay (ms)
+RETRY_INTERVAL = 3000
+# events buffered per client, slow clients get a `resync` event instead.
+QUEUE_SIZE = 100
+RECONNECT_DELAY = 5
+
+
+def topic_stream(topic_id):
+    return f"topic:{topic_id}"
+
+
+def thread_stream(thread_id):
+    return f"thread:{thread_id}"
+
+
+def is_enabled():
+    # LISTEN/NOTIFY is Postgres only
+    return connection.vendor == "postgresql"
+
+
+def publish(event):
+    """
+    Publish `event` (`{"type": ..., "streams": [...], ...}`) to the stream workers.
+    Sent when the current transaction commits, dropped when it's rolled back.
+    """
+    if not is_enabled():
+        return
+
+    payload = json.dumps(event)
+    if len(payload.encode()) > MAX_PAYLOAD_SIZE:
+        payload = json.dumps({k: v for k, v in event.items() if k != "data"})
+    try:
+        # in a savepoint, a failure must not abort the caller's transaction.
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+    except Exception as e:
+        log.error(str(e))
+
+
+def publish_thread_created(thread):
+    # to avoid circular dependency
+    from forum.api.serializers import ThreadSerializer
+
+    if not is_enabled():
+        return
+
+    # brand new, nothing to load.
+    thread._stats = {}
+    publish(
+        {
+            "type": "thread.created",
+            "streams": [topic_stream(thread.topic_id)],
+            "id": thread.pk,
+            "data": ThreadSerializer(thread).data,
+        }
+    )
+
+
+def publish_reply_created(reply):
+    # to avoid circular dependency
+    from forum.api.serializers import ReplySerializer
+
+    if not is_enabled():
+        return
+
+    # brand new, nothing to load.
+    reply._stats = {}
+    reply._replies = []
+    publish(
+        {
+            "type": "reply.created",
+            "streams": [thread_stream(reply.thread_id)],
+            "id": reply.pk,
+            "data": ReplySerializer(reply).data,
+        }
+    )
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode()
+
+
+RESYNC_MESSAGE = format_event({"type": "resync"})
+
+
+class Broker:
+    """
+    Single `LISTEN` connection per worker process, shared by every stream it serves.
+    Events are encoded once and put in the queue of each subscriber of their streams.
+    """
+
+    def __init__(self, channel=CHANNEL):
+        self.channel = channel
+        self.streams = defaultdict(set)
+        self.connection = None
+        self.reconnecting = False
+
+    @property
+    def subscriber_count(self):
+        return sum(len(queues) for queues in self.streams.values())
+
+    def subscribe(self, stream):
+        if self.connection is None and not self.reconnecting:
+            self.listen()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.streams[stream].add(queue)
+        return queue
+
+    def unsubscribe(self, stream, queue):
+        queues = self.streams.get(stream)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.streams[stream]
+
+    def listen(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        loop = asyncio.get_event_loop()
+        try:
+            self.connection = psycopg2.connect(
+                **connections["default"].get_connection_params()
+            )
+            self.connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            loop.add_reader(self.connection.fileno(), self.on_notify)
+        except psycopg2.Error as e:
+            log.error(str(e))
+            self.close()
+            self.schedule_reconnect()
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            asyncio.get_event_loop().remove_reader(self.connection.fileno())
+        except Exception:
+            pass
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+        self.connection = None
+
+    def schedule_reconnect(self):
+        def reconnect():
+            self.reconnecting = False
+            if self.streams:
+                self.listen()
+                # events published while disconnected are lost.
+                if self.connection is not None:
+                    self.broadcast(RESYNC_MESSAGE)
+
+        self.reconnecting = True
+        asyncio.get_event_loop().call_later(RECONNECT_DELAY, reconnect)
+
+    def on_notify(self):
+        import psycopg2
+
+        try:
+            self.connection.poll()
+        except psycopg2.Error as e:
+            log.error(str(e))
+            self.close()
+            self.schedule_reconnect()
+            return
+
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                event = json.loads(notify.payload)
+            except ValueError:
+                continue
+            self.dispatch(event)
+
+    def dispatch(self, event):
+        message = None
+        for stream in event.get("streams", []):
+            queues = self.streams.get(stream)
+            if not queues:
+                continue
+            if message is None:
+                message = format_event(event)
+            for queue in queues:
+                self.put(queue, message)
+
+    def broadcast(self, message):
+        for queues in self.streams.values():
+            for queue in queues:
+                self.put(queue, message)
+
+    def put(self, queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # client can't keep up, tell it to refetch instead.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC_MESSAGE)
+
+
+broker = Broker()
+
+
+async def send_status(send, status, body=b""):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"text/plain")],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def stream_application(scope, receive, send):
+    """
+    ASGI app serving the Server-Sent Events streams.
+    """
+    match = STREAM_PATH.match(scope["path"])
+    if match is None:
+        await send_status(send, 404, b"Not Found")
+        return
+    if scope["method"] != "GET":
+        await send_status(send, 405, b"Method Not Allowed")
+        return
+
+    stream = f"{match['kind']}:{match['pk']}"
+    queue = broker.subscribe(stream)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # don't let nginx buffer the stream
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": f"retry: {RETRY_INTERVAL}\n: connected pid={os.getpid()}\n\n".encode(),
+                "more_body": True,
+            }
+        )
+
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected},
+                timeout=KEEPALIVE_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                message.cancel()
+                break
+            if message in done:
+                body = message.result()
+            else:
+                message.cancel()
+                body = b": ping\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        broker.unsubscribe(stream, queue)
+        disconnected.cancel()
@@ -3,15 +3,18 @@ from django.dispatch import receiver
 
 from .events import OnThreadCreated, OnReplyCreated
 from .models import Thread, Reply
+from .realtime import publish_thread_created, publish_reply_created
 
 
 @receiver(post_save, sender=Thread, dispatch_uid="Thread:post_save")
 def thread_post_save(sender, instance, created, **kwargs):
     if created:
         OnThreadCreated(instance)
+        publish_thread_created(instance)
 
 
 @receiver(post_save, sender=Reply, dispatch_uid="Reply:post_save")
 def thread_answer_post_save(sender, instance, created, **kwargs):
     if created:
         OnReplyCreated(instance)
+        publish_reply_created(instance)
@@ -0,0 +1,164 @@
+"""
+Write-behind buffer for hot stats (eg. thread view count).
+
+Increments are accumulated in the shared cache instead of updating the same
+`Stat` row on every view, then written in bulk by `Stat.flush_buffer()`: in background
+at most every `FLUSH_INTERVAL` seconds when stats are buffered (see `flush_due()`),
+or by the `forum_flush_stats` command (eg. `--loop` in a worker).
+
+Every buffered stat has a counter key, the first increment after a flush also
+registers the stat in a numbered slot so the flusher knows which counters to read
+without scanning the cache. Counters are drained with `decr`, so increments
+that land while flushing are kept for the next flush.
+
+The buffer is only used with a cache shared by every process with atomic `incr`
+and `add` (see `is_enabled()`), stats are written directly otherwise.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = "forum_stat_buffer"
+SEQ_KEY = f"{KEY_PREFIX}:seq"
+FLUSHED_SEQ_KEY = f"{KEY_PREFIX}:flushed_seq"
+FLUSH_LOCK_KEY = f"{KEY_PREFIX}:lock"
+FLUSH_DUE_KEY = f"{KEY_PREFIX}:flush_due"
+METRIC_BUFFERED_KEY = f"{KEY_PREFIX}:metrics:buffered"
+METRIC_FLUSHED_KEY = f"{KEY_PREFIX}:metrics:flushed"
+
+# counters never expire, losing them means losing counts.
+COUNTER_TIMEOUT = None
+# a registration (and its slot) could be evicted by the cache, once the marker
+# expires the next increment register the stat again.
+DIRTY_TIMEOUT = 60 * 60
+FLUSH_LOCK_TIMEOUT = 60 * 5
+FLUSH_INTERVAL = 30
+# slots still missing after this many newer slots are considered lost.
+MISSING_SLOT_GRACE = 100
+# shared caches with atomic `incr` and `add`. Others would lose counts: per-process
+# caches (locmem) are never seen by the flusher, `FileBasedCache` read-modify-writes.
+ATOMIC_BACKENDS = (
+    "django_redis.cache.RedisCache",
+    "django.core.cache.backends.memcached.MemcachedCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+
+
+def is_enabled():
+    return settings.CACHES["default"]["BACKEND"] in ATOMIC_BACKENDS
+
+
+def _counter_key(content_type_id, content_id, stat_type):
+    return f"{KEY_PREFIX}:{content_type_id}:{content_id}:{stat_type}"
+
+
+def _slot_key(slot):
+    return f"{KEY_PREFIX}:slot:{slot}"
+
+
+def _incr(key, delta=1, timeout=COUNTER_TIMEOUT):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, delta, timeout)
+        return delta
+
+
+def add(content_type_id, content_id, stat_type, value=1):
+    key = _counter_key(content_type_id, content_id, stat_type)
+    _incr(key, value)
+    if cache.add(f"{key}:dirty", 1, DIRTY_TIMEOUT):
+        slot = _incr(SEQ_KEY)
+        cache.set(
+            _slot_key(slot), (content_type_id, content_id, stat_type), COUNTER_TIMEOUT
+        )
+    _incr(METRIC_BUFFERED_KEY, value)
+
+
+def flush_due():
+    """
+    Returns `True` at most once every `FLUSH_INTERVAL` seconds (across processes),
+    for the caller to flush the buffer.
+    """
+    return cache.add(FLUSH_DUE_KEY, 1, FLUSH_INTERVAL)
+
+
+def pending(stats):
+    """
+    Returns buffered (not flushed yet) values for `stats`,
+    a list of `(content_type_id, content_id, stat_type)`.
+    """
+    if not is_enabled():
+        return {}
+    keys = {_counter_key(*stat): stat for stat in stats}
+    values = cache.get_many(keys.keys())
+    return {keys[key]: value for key, value in values.items() if value}
+
+
+def drain():
+    """
+    Take buffered values out of the cache, returns `{(content_type_id, content_id, stat_type): value}`.
+    Returns `None` when another flush is running.
+    """
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return None
+
+    try:
+        flushed_seq = cache.get(FLUSHED_SEQ_KEY, 0)
+        seq = cache.get(SEQ_KEY, 0)
+        slot_keys = [_slot_key(slot) for slot in range(flushed_seq + 1, seq + 1)]
+        slots = cache.get_many(slot_keys)
+
+        # a slot could be registered but not written yet, stop right before it
+        # so the next flush picks it up (unless it's been missing for too long).
+        last_seq = seq
+        for slot in range(flushed_seq + 1, seq + 1):
+            if _slot_key(slot) not in slots and seq - slot < MISSING_SLOT_GRACE:
+                last_seq = slot - 1
+                break
+        done_keys = [_slot_key(slot) for slot in range(flushed_seq + 1, last_seq + 1)]
+
+        increments = {}
+        for slot_key in done_keys:
+            stat = slots.get(slot_key)
+            if stat is None or stat in increments:
+                continue
+            key = _counter_key(*stat)
+            # unregister first, so new increments register a new slot.
+            cache.delete(f"{key}:dirty")
+            value = cache.get(key, 0)
+            if value:
+                cache.decr(key, value)
+                increments[stat] = value
+
+        cache.delete_many(done_keys)
+        cache.set(FLUSHED_SEQ_KEY, last_seq, COUNTER_TIMEOUT)
+        return increments
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def restore(increments):
+    """
+    Put drained values back when they can't be written.
+    """
+    for stat, value in increments.items():
+        add(*stat, value=value)
+        # not a new view, don't count it twice.
+        cache.decr(METRIC_BUFFERED_KEY, value)
+
+
+def mark_flushed(value):
+    _incr(METRIC_FLUSHED_KEY, value)
+
+
+def metrics():
+    values = cache.get_many(
+        [METRIC_BUFFERED_KEY, METRIC_FLUSHED_KEY, SEQ_KEY, FLUSHED_SEQ_KEY]
+    )
+    return {
+        "buffered": values.get(METRIC_BUFFERED_KEY, 0),
+        "flushed": values.get(METRIC_FLUSHED_KEY, 0),
+        "pending_slots": values.get(SEQ_KEY, 0) - values.get(FLUSHED_SEQ_KEY, 0),
+    }
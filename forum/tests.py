@@ -1,3 +1,135 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from account.models import User
+from forum import stat_buffer
+from forum.models import Reply, Stat, Thread, Topic
+from projects.models import Project
+
+
+class ForumTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='secret')
+        project = Project.objects.create(title='Project', description='Project', user=self.user)
+        self.topic = Topic.objects.create(
+            title='Topic', user=self.user,
+            content_type=ContentType.objects.get_for_model(Project), content_id=project.pk)
+        self.thread = Thread.objects.create(
+            title='Thread', description='Description', topic=self.topic, user=self.user)
+        self.client = Client(HTTP_HOST='localhost')
+
+    def reply(self, message='Reply', parent=None, user=None):
+        return Reply.objects.create(
+            thread=self.thread, message=message, parent=parent, user=user or self.user,
+            level=parent.level + 1 if parent else 0)
+
+
+class ReplyDetailTest(ForumTestCase):
+
+    def test_replies_and_stats_preloaded(self):
+        reply = self.reply()
+        child = self.reply('Child', parent=reply)
+        for _ in range(3):
+            reply.inc_like_count()
+
+        response = self.client.get(reverse('forum:api:reply_detail', args=[reply.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['stats'].get('like_count'), 3)
+        self.assertEqual([r['id'] for r in data['replies']], [child.pk])
+
+
+class ThreadViewTest(ForumTestCase):
+
+    def view(self, client=None):
+        url = reverse('forum:api:thread_view', args=[self.thread.pk])
+        return (client or self.client).post(url)
+
+    def views(self):
+        return Stat.values_for(Thread, [self.thread.pk])[self.thread.pk].get('view_count', 0)
+
+    def test_counted_once_per_viewer(self):
+        self.assertEqual(self.view().status_code, 204)
+        self.assertEqual(self.view().status_code, 204)
+        self.assertEqual(self.views(), 1)
+
+        other = Client(HTTP_HOST='localhost')
+        other.login(username='alice', password='secret')
+        self.view(other)
+        self.view(other)
+        self.assertEqual(self.views(), 2)
+
+    @mock.patch('upkoding.throttling.get_rate', return_value=(2, 60))
+    def test_throttled(self, get_rate):
+        self.assertEqual(self.view().status_code, 204)
+        self.assertEqual(self.view().status_code, 204)
+        response = self.view()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class StatBufferTest(ForumTestCase):
+
+    def test_enabled_for_atomic_backends_only(self):
+        backends = {
+            'django_redis.cache.RedisCache': True,
+            'django.core.cache.backends.locmem.LocMemCache': False,
+            'django.core.cache.backends.filebased.FileBasedCache': False,
+        }
+        for backend, enabled in backends.items():
+            with override_settings(CACHES={'default': {'BACKEND': backend}}):
+                self.assertEqual(stat_buffer.is_enabled(), enabled, backend)
+
+    @mock.patch('forum.models.defer')
+    @mock.patch('forum.stat_buffer.is_enabled', return_value=True)
+    def test_flushed_in_background(self, is_enabled, defer):
+        self.thread.inc_view_count()
+        self.thread.inc_view_count()
+        # at most once per interval
+        defer.assert_called_once_with(Stat.flush_buffer)
+
+        Stat.flush_buffer()
+        self.assertEqual(Stat.values_for(Thread, [self.thread.pk])[self.thread.pk]['view_count'], 2)
+
+
+class UnreadCountTest(ForumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create_user(username='bob', password='secret')
+        self.bob_client = Client(HTTP_HOST='localhost')
+        self.bob_client.login(username='bob', password='secret')
+        self.client.login(username='alice', password='secret')
+
+    def unread_count(self, client):
+        response = client.get(reverse('forum:api:thread_list'), {'topic': self.topic.pk})
+        self.assertEqual(response.status_code, 200)
+        thread, = response.json()['results']
+        return thread['unread_count']
+
+    def test_own_replies_are_read(self):
+        self.client.post(reverse('forum:api:thread_view', args=[self.thread.pk]))
+        self.bob_client.post(reverse('forum:api:thread_view', args=[self.thread.pk]))
+        for message in ('First', 'Second'):
+            response = self.bob_client.post(
+                reverse('forum:api:reply_list'), {'thread': self.thread.pk, 'message': message})
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.unread_count(self.bob_client), 0)
+        self.assertEqual(self.unread_count(self.client), 2)
+
+    def test_deleted_replies_not_counted(self):
+        self.reply('First', user=self.bob)
+        self.client.post(reverse('forum:api:thread_view', args=[self.thread.pk]))
+        deleted = self.reply('Second', user=self.bob)
+        deleted.status = Reply.STATUS_DELETED
+        deleted.save()
+        self.reply('Third', user=self.bob)
+
+        self.assertEqual(self.unread_count(self.client), 1)
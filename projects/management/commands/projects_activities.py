@@ -1,12 +1,55 @@
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from stream.exceptions import RateLimitReached
 
+from upkoding.activity_feed import feed_manager
 from projects.models import UserProjectEvent
 from projects.notifications import UserProjectEventNotification, delete_activity
 
 
+class RateLimiter:
+    """
+    Shared between worker threads:
+    - spaces out calls so we send at most `rate` calls per second (0 = unlimited).
+    - once Stream tells us we're rate limited, every worker pause until `backoff` passed.
+    """
+
+    def __init__(self, rate: float = 0):
+        self.interval = (1.0 / rate) if rate else 0
+        self.next_call = 0
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_call, self.paused_until)
+            self.next_call = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
 class Command(BaseCommand):
     help = 'Sync existing projects activities to getstream.io'
 
+    event_types = [
+        UserProjectEvent.TYPE_PROJECT_START,
+        UserProjectEvent.TYPE_PROJECT_COMPLETE,
+        UserProjectEvent.TYPE_PROJECT_INCOMPLETE,
+        UserProjectEvent.TYPE_REVIEW_MESSAGE,
+        UserProjectEvent.TYPE_REVIEW_REQUEST,
+    ]
+
     def add_arguments(self, parser):
         parser.add_argument('--sync', action='store_true',
                             help='Sync all activities')
@@ -14,62 +57,171 @@ class Command(BaseCommand):
                             help='Delete all activities')
         parser.add_argument('--dry', action='store_true',
                             help='Run simulation (not executing real action)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of events loaded from database at a time')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of concurrent requests to getstream.io')
+        parser.add_argument('--rate', type=float, default=10,
+                            help='Max requests per second to getstream.io (0 = unlimited)')
+        parser.add_argument('--retries', type=int, default=5,
+                            help='Max retries of a request when rate limited')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Checkpoint file path, default: <BASE_DIR>/.projects_activities_<action>.json')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore existing checkpoint and start from the first event')
 
     def handle(self, *args, **options):
-        is_dry = options.get('dry')
         if options['sync']:
-            self.sync(is_dry)
+            action = 'sync'
         elif options['delete']:
-            self.delete(is_dry)
-
-    def sync(self, dry):
-        event_types = [
-            UserProjectEvent.TYPE_PROJECT_START,
-            UserProjectEvent.TYPE_PROJECT_COMPLETE,
-            UserProjectEvent.TYPE_PROJECT_INCOMPLETE,
-            UserProjectEvent.TYPE_REVIEW_MESSAGE,
-            UserProjectEvent.TYPE_REVIEW_REQUEST,
-        ]
-        events = UserProjectEvent.objects.filter(
-            event_type__in=event_types)
-        total_count = len(events)
-        success_count = 0
-        for event in events:
-            try:
-                if not dry:
+            action = 'delete'
+        else:
+            return
+
+        self.is_dry = options.get('dry')
+        self.retries = options['retries']
+        self.limiter = RateLimiter(options['rate'])
+        self.checkpoint_path = Path(
+            options['checkpoint'] or settings.BASE_DIR / f'.projects_activities_{action}.json')
+        if options['restart'] and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+        last_pk = self.load_checkpoint(action)
+        if last_pk:
+            self.stdout.write(self.style.WARNING(
+                f'Resuming {action} after event {last_pk}.'))
+
+        events = UserProjectEvent.objects \
+            .select_related('user', 'user_project__user', 'user_project__project') \
+            .filter(event_type__in=self.event_types, pk__gt=last_pk) \
+            .order_by('pk')
+
+        self.total_count = events.count()
+        self.done_count = 0
+        self.success_count = 0
+        self.started = time.monotonic()
+        failed_pks = []
+
+        process_chunk = self.sync_chunk if action == 'sync' else self.delete_chunk
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for chunk in self.chunks(events, options['chunk_size']):
+                chunk_failed_pks = process_chunk(executor, chunk)
+                failed_pks.extend(chunk_failed_pks)
+
+                # only move the checkpoint forward while every event before it succeed,
+                # so a resumed run retries the failed ones.
+                if not failed_pks and not self.is_dry:
+                    self.save_checkpoint(action, chunk[-1].pk)
+
+                self.done_count += len(chunk)
+                self.success_count += len(chunk) - len(chunk_failed_pks)
+                self.progress()
+
+        if not failed_pks and not self.is_dry and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+        verb = 'synced' if action == 'sync' else 'deleted'
+        self.stdout.write(self.style.WARNING(
+            f'Finish! {self.success_count} out of {self.total_count} event(s) successfully {verb}.'))
+        if failed_pks:
+            raise CommandError(
+                f'[ERR] {len(failed_pks)} event(s) not {verb}: {failed_pks[:20]}. '
+                f'Run the same command again to resume from event {failed_pks[0]}.')
+
+    def chunks(self, queryset, size):
+        chunk = []
+        for event in queryset.iterator(chunk_size=size):
+            chunk.append(event)
+            if len(chunk) == size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def sync_chunk(self, executor, events):
+        """
+        Build activities for `events` and send them to getstream.io grouped by feed.
+        Returns pk of events that failed.
+        """
+        failed_pks = set()
+        with feed_manager.collect_activities() as batch:
+            for event in events:
+                try:
                     UserProjectEventNotification(event=event, is_sync=True)
-                self.stdout.write(self.style.SUCCESS(
-                    f'[OK] Event {event.pk} synced'))
-                success_count += 1
+                except Exception as e:
+                    self.stderr.write(f'[ERR] Event {event.pk} not synced. Err: {e}')
+                    failed_pks.add(event.pk)
+
+        if self.is_dry:
+            return sorted(failed_pks)
+
+        def send(feed, activities):
+            try:
+                self.call(feed_manager.add_activities, feed, activities)
+                return []
             except Exception as e:
-                raise CommandError(
-                    f'[ERR] Event {event.pk} not synced. Err: {e}')
+                self.stderr.write(f'[ERR] Feed {feed.id} not synced. Err: {e}')
+                # foreign_id format: projects.UserProjectEvent:<pk>
+                return [int(a['foreign_id'].split(':')[1]) for a in activities]
 
-        self.stdout.write(self.style.WARNING(
-            f'Finish! {success_count} out of {total_count} event(s) successfully synced.'))
-
-    def delete(self, dry):
-        event_types = [
-            UserProjectEvent.TYPE_PROJECT_START,
-            UserProjectEvent.TYPE_PROJECT_COMPLETE,
-            UserProjectEvent.TYPE_PROJECT_INCOMPLETE,
-            UserProjectEvent.TYPE_REVIEW_MESSAGE,
-            UserProjectEvent.TYPE_REVIEW_REQUEST,
-        ]
-        events = UserProjectEvent.objects.filter(
-            event_type__in=event_types)
-        total_count = len(events)
-        success_count = 0
-        for event in events:
+        futures = [executor.submit(send, feed, activities)
+                   for feed, activities in batch.batches()]
+        for future in futures:
+            failed_pks.update(future.result())
+        return sorted(failed_pks)
+
+    def delete_chunk(self, executor, events):
+        """
+        Remove activities of `events` from getstream.io.
+        Returns pk of events that failed.
+        """
+        if self.is_dry:
+            return []
+
+        def delete(event):
             try:
-                if not dry:
-                    delete_activity(event)
-                self.stdout.write(self.style.SUCCESS(
-                    f'[OK] Activity {event.pk} deleted'))
-                success_count += 1
+                self.call(delete_activity, event, fail_silently=False)
+                return None
             except Exception as e:
-                raise CommandError(
-                    f'[ERR] Activity {event.pk} not deleted. Err: {e}')
+                self.stderr.write(f'[ERR] Activity {event.pk} not deleted. Err: {e}')
+                return event.pk
 
-        self.stdout.write(self.style.WARNING(
-            f'Finish! {success_count} out of {total_count} activities(s) successfully deleted.'))
+        return sorted(pk for pk in executor.map(delete, events) if pk is not None)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call `func` respecting the rate limit, retry with exponential backoff when rate limited.
+        """
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            try:
+                return func(*args, **kwargs)
+            except RateLimitReached:
+                if attempt == self.retries:
+                    raise
+                backoff = 2 ** attempt
+                self.limiter.pause(backoff)
+                self.stderr.write(f'[WARN] Rate limited, backing off {backoff}s.')
+
+    def progress(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done_count / elapsed if elapsed else 0
+        remaining = self.total_count - self.done_count
+        eta = int(remaining / rate) if rate else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] {self.done_count}/{self.total_count} event(s) processed, '
+            f'{self.success_count} ok, {rate:.1f} events/s, ETA {eta}s'))
+
+    def load_checkpoint(self, action):
+        try:
+            checkpoint = json.loads(self.checkpoint_path.read_text())
+            if checkpoint.get('action') == action:
+                return checkpoint.get('last_pk', 0)
+        except (FileNotFoundError, ValueError):
+            pass
+        return 0
+
+    def save_checkpoint(self, action, last_pk):
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'action': action, 'last_pk': last_pk}))
+        tmp_path.replace(self.checkpoint_path)
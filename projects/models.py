@@ -12,6 +12,7 @@ from sorl.thumbnail import ImageField
 from stream_django.activity import Activity, create_model_reference
 
 from account.models import User
+from coders.models import PointEntry
 from codeblocks.models import CodeBlock
 from roadmaps.models import Roadmap, RoadmapTopicContent
 
@@ -458,7 +459,7 @@ class UserProject(models.Model):
 
         exception for staff and pro user.
         """
-        if user.is_staff or user.is_pro_user():
+        if user.is_staff or user.entitlement.is_pro:
             return True
         yesterday = now() - timedelta(days=1)
         return self.created <= yesterday
@@ -470,17 +471,17 @@ class UserProject(models.Model):
             return False
 
         codeblock = self.codeblock
-        is_pro_user = user.is_pro_user()
+        entitlement = user.entitlement
 
         # PRO user always can run codes
-        if is_pro_user:
+        if entitlement.is_pro:
             return True
 
         # if this is premium project, but user not PRO -> disallow!
-        if self.project.is_premium and not is_pro_user:
+        if self.project.is_premium:
             return False
 
-        MAX_RUN = 10
+        MAX_RUN = entitlement.code_run_limit
 
         # If never run 3 times OR not the first-or-last run of 3 -> allow!
         mod = codeblock.run_count % MAX_RUN
@@ -504,7 +505,7 @@ class UserProject(models.Model):
         self.save()
 
         # add point to user
-        self.user.add_point(self.point)
+        self.user.add_point(self.point, PointEntry.REASON_PROJECT_COMPLETE, f'userproject:{self.pk}')
 
         # increment completed count on project
         self.project.inc_completed_count()
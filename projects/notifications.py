@@ -63,7 +63,8 @@ class UserProjectEventNotification:
 
             # check user notification settings
             if (
-                staff.is_email_verified()
+                not self.is_sync
+                and staff.is_email_verified()
                 and UserSetting.objects.email_notify_project_review_request(staff)
             ):
                 self.context.update({"to_user": staff})
@@ -100,7 +101,8 @@ class UserProjectEventNotification:
 
             # check user notification settings
             if (
-                to_user.is_email_verified()
+                not self.is_sync
+                and to_user.is_email_verified()
                 and UserSetting.objects.email_notify_project_message(to_user)
             ):
                 self.context.update({"to_user": to_user})
@@ -178,5 +180,5 @@ class UserProjectEventNotification:
             )
 
 
-def delete_activity(instance):
-    feed_manager.remove_activity_from_feed(instance)
+def delete_activity(instance, fail_silently=True):
+    feed_manager.remove_activity_from_feed(instance, fail_silently=fail_silently)
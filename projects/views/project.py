@@ -13,19 +13,25 @@ from django.http.response import (
     JsonResponse,
 )
 from django.shortcuts import get_object_or_404, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views.generic import ListView, DetailView
 from django.views.generic.base import View
-from stream_django.enrich import Enrich
-from upkoding.activity_feed import feed_manager
+from upkoding.activity_feed import feed_manager, ActivityEnrich
+from upkoding.throttling import throttle
 
 from account.models import User
+from forum.api.views import get_discussion_bootstrap
 from projects.forms import UserProjectReviewRequestForm, UserProjectCodeSubmissionForm
 from projects.models import Project, UserProject, UserProjectEvent
 
 log = logging.getLogger(__file__)
 
 
+def is_code_submission(request):
+    return request.POST.get("action") == "code_submission"
+
+
 class ProjectList(ListView):
     paginate_by = 18
 
@@ -124,26 +130,32 @@ class ProjectDetail(DetailView):
             "project_id": project.id,
             "current_user_id": user.id,
             "pop_thread_id": self.request.GET.get("t"),
+            # saves the discuss app a few API calls on load
+            "bootstrap": get_discussion_bootstrap(self.request, project),
         }
         return data
 
+    def render_activities(self, feed):
+        enricher = ActivityEnrich(
+            (
+                "actor",
+                "target",
+            )
+        )
+        activities = feed.get(limit=6)["results"]
+        enriched = enricher.enrich_activities(activities)
+        return render_to_string("projects/_activities.html", {"activities": enriched})
+
     def get(self, request, *args, **kwargs):
         if request.GET.get("partial") == "activities":
             # activities
             try:
                 project = self.get_object()
-                enricher = Enrich(
-                    (
-                        "actor",
-                        "target",
-                    )
-                )
                 feed = feed_manager.get_challenge_feed(challenge_id=project.pk)
-                activities = feed.get(limit=6)["results"]
-                enriched = enricher.enrich_activities(activities)
-                return render(
-                    request, "projects/_activities.html", {"activities": enriched}
+                content = feed_manager.get_cached_fragment(
+                    feed, lambda: self.render_activities(feed)
                 )
+                return HttpResponse(content)
             except Exception:
                 return HttpResponse()
 
@@ -384,6 +396,7 @@ class ProjectDetailUser(DetailView):
             return HttpResponse(user_project.get_absolute_url())
 
     @method_decorator(login_required)
+    @method_decorator(throttle("code_submission", condition=is_code_submission))
     def post(self, request, slug, pk, username):
         user = request.user
         if user.username != username:
@@ -6,6 +6,7 @@ from django.http.response import HttpResponseBadRequest, HttpResponseForbidden,
 from django.views.generic import DetailView
 from django.template.loader import render_to_string
 
+from coders.models import PointEntry
 from projects.models import UserProject, UserProjectEvent, UserProjectParticipant
 
 
@@ -76,7 +77,8 @@ class ProjectReview(LoginRequiredMixin, DetailView):
 
                 # withdraw point and counter if it was approved
                 if was_complete:
-                    owner.remove_point(user_project.point)
+                    owner.remove_point(user_project.point, PointEntry.REASON_PROJECT_INCOMPLETE,
+                                       f'userproject:{user_project.pk}')
 
                     # decrement completed count on project
                     project = user_project.project
@@ -1,13 +1,61 @@
+import time
 import logging
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from django.core.cache import cache
+from stream_django.enrich import Enrich
 from stream_django.managers import FeedManager as DefaultFeedManager
 
 log = logging.getLogger(__name__)
 
+# rendered activity fragments are shared by every visitor, keep them briefly
+# and rebuild on demand (or earlier when new activity added to the feed).
+FRAGMENT_CACHE_TIMEOUT = 60
+# stale copy served to concurrent visitors while one request is rebuilding.
+FRAGMENT_STALE_TIMEOUT = 60 * 30
+# how long a rebuild may hold the lock before others give up waiting.
+FRAGMENT_LOCK_TIMEOUT = 10
+FRAGMENT_LOCK_POLL_INTERVAL = 0.1
+
+# unread notifications counter, reset when user open their notifications.
+NOTIFICATION_UNREAD_TIMEOUT = 60 * 60 * 24 * 30
+
+# Stream accepts at most 100 activities per `add_activities` call.
+MAX_BATCH_ACTIVITIES = 100
+
+
+class ActivityBatch:
+    """
+    Activities collected by `FeedManager.collect_activities()`, grouped by feed.
+    """
+
+    def __init__(self):
+        self.feeds = {}
+        self.activities = defaultdict(list)
+
+    def add(self, feed, activity):
+        self.feeds[feed.id] = feed
+        self.activities[feed.id].append(activity)
+
+    def __len__(self):
+        return sum(len(activities) for activities in self.activities.values())
+
+    def batches(self, size=MAX_BATCH_ACTIVITIES):
+        """
+        Yields `(feed, activities)` with at most `size` activities each.
+        """
+        for feed_id, activities in self.activities.items():
+            for i in range(0, len(activities), size):
+                yield self.feeds[feed_id], activities[i : i + size]
+
 
 class FeedManager(DefaultFeedManager):
     CHALLENGE_FEED = "challenge"
     CHALLENGE_FEED_AGGREGATED = "challenge_aggregated"
 
+    _local = threading.local()
+
     def get_challenge_feed(self, challenge_id: str, aggregated: str = False):
         if aggregated:
             return self.get_feed(self.CHALLENGE_FEED_AGGREGATED, challenge_id)
@@ -23,16 +71,205 @@ class FeedManager(DefaultFeedManager):
         return activity
 
     def add_activity(self, feed, activity):
+        batch = getattr(self._local, "batch", None)
+        if batch is not None:
+            batch.add(feed, activity)
+            return
+
         try:
             feed.add_activity(activity)
+            self.inc_unread_counts(activity.get("to", []))
         except Exception as e:
             log.error(str(e))
+        finally:
+            self.invalidate_fragments([feed.id] + activity.get("to", []))
+
+    @contextmanager
+    def collect_activities(self):
+        """
+        Collect activities instead of sending them one by one.
+        Usage:
+            with feed_manager.collect_activities() as batch:
+                ...
+            for feed, activities in batch.batches():
+                feed_manager.add_activities(feed, activities)
+        """
+        self._local.batch = ActivityBatch()
+        try:
+            yield self._local.batch
+        finally:
+            self._local.batch = None
+
+    def add_activities(self, feed, activities):
+        """
+        Send `activities` to `feed` in a single call, errors are raised to the caller.
+        Unread counters are only incremented once the activities were sent.
+        """
+        to = [feed_id for activity in activities for feed_id in activity.get("to", [])]
+        try:
+            result = feed.add_activities(activities)
+        finally:
+            self.invalidate_fragments([feed.id] + to)
+        self.inc_unread_counts(to)
+        return result
 
-    def remove_activity_from_feed(self, instance):
+    def remove_activity_from_feed(self, instance, fail_silently=True):
         try:
             super().remove_activity_from_feed(instance)
         except Exception as e:
+            if not fail_silently:
+                raise
             log.error(str(e))
 
+    # Unread notifications counter.
+    #
+    # Incremented for every notification feed an activity fanned out to,
+    # so a badge only costs a single cache read instead of fetching the feed.
+
+    def _unread_key(self, user_id):
+        return f"notification_unread:{user_id}"
+
+    def inc_unread_counts(self, feed_ids):
+        """
+        Count one unread notification per occurrence of a notification feed in
+        `feed_ids`, eg. the `to` of every activity of a batch.
+        """
+        prefix = f"{self.notification_feed}:"
+        for feed_id, count in Counter(feed_ids).items():
+            if not feed_id.startswith(prefix):
+                continue
+            key = self._unread_key(feed_id[len(prefix) :])
+            cache.add(key, 0, NOTIFICATION_UNREAD_TIMEOUT)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # expired between add() and incr()
+                cache.set(key, count, NOTIFICATION_UNREAD_TIMEOUT)
+
+    def get_unread_count(self, user_id):
+        return cache.get(self._unread_key(user_id), 0)
+
+    def reset_unread_count(self, user_id):
+        cache.delete(self._unread_key(user_id))
+
+    # Rendered fragment cache.
+    #
+    # Fragments are keyed by feed id (eg. `challenge:12`), a fresh copy lives for
+    # `FRAGMENT_CACHE_TIMEOUT` and a stale copy for `FRAGMENT_STALE_TIMEOUT`.
+    # On a miss only a single request (the one holding the lock) fetch from Stream,
+    # the others get the stale copy or wait for the rebuild to finish.
+
+    def _fragment_key(self, feed_id: str):
+        return f"activity_fragment:{feed_id}"
+
+    def _fragment_stale_key(self, feed_id: str):
+        return f"activity_fragment:{feed_id}:stale"
+
+    def _fragment_lock_key(self, feed_id: str):
+        return f"activity_fragment:{feed_id}:lock"
+
+    def get_cached_fragment(self, feed, render, timeout=FRAGMENT_CACHE_TIMEOUT):
+        """
+        Returns rendered fragment of `feed` from cache, or call `render()` to build it.
+        `render` must return a string and raise an exception on failure,
+        failed renders are never cached.
+        """
+        key = self._fragment_key(feed.id)
+        content = cache.get(key)
+        if content is not None:
+            return content
+
+        lock_key = self._fragment_lock_key(feed.id)
+        if cache.add(lock_key, 1, FRAGMENT_LOCK_TIMEOUT):
+            try:
+                return self._render_fragment(feed, render, timeout)
+            finally:
+                cache.delete(lock_key)
+
+        # someone else is rebuilding, serve stale copy when we have one.
+        content = cache.get(self._fragment_stale_key(feed.id))
+        if content is not None:
+            return content
+
+        # otherwise wait for the rebuild to finish, unless the lock isn't held
+        # at all (eg. cache errors ignored by the backend), nothing to wait for then.
+        deadline = time.monotonic() + FRAGMENT_LOCK_TIMEOUT
+        while cache.get(lock_key) is not None and time.monotonic() < deadline:
+            time.sleep(FRAGMENT_LOCK_POLL_INTERVAL)
+            content = cache.get(key)
+            if content is not None:
+                return content
+        content = cache.get(key)
+        if content is not None:
+            return content
+        return self._render_fragment(feed, render, timeout)
+
+    def _render_fragment(self, feed, render, timeout):
+        content = render()
+        cache.set(self._fragment_key(feed.id), content, timeout)
+        cache.set(self._fragment_stale_key(feed.id), content, FRAGMENT_STALE_TIMEOUT)
+        return content
+
+    def invalidate_fragments(self, feed_ids):
+        """
+        Drop fresh fragments of `feed_ids`, stale copies are kept so they can be served
+        while the fragments are being rebuilt.
+        """
+        cache.delete_many([self._fragment_key(feed_id) for feed_id in set(feed_ids)])
+
+
+class ActivityEnrich(Enrich):
+    """
+    Enricher for UpKoding activities.
+
+    References from every activity (and every field, including `target`) are
+    collected first and each model is loaded once, together with the relations
+    the activity templates follow. Relations pointing to an already loaded object
+    (eg. `UserProject.user` and the activity `actor`) share the same instance,
+    and user avatars are resolved once for the sizes used by the templates.
+    """
+
+    DEFAULT_FIELDS = ("actor", "object", "target")
+
+    # `select_related` paths needed by the templates, keyed by model reference.
+    RELATED_MODELS = {
+        "projects.UserProject": ("user", "project"),
+    }
+    # avatar sizes rendered by `_templates/activity/*`
+    AVATAR_SIZES = (64, 100)
+    USER_MODEL = "account.User"
+
+    def __init__(self, fields=DEFAULT_FIELDS):
+        super().__init__(fields)
+
+    def fetch_model_instances(self, modelClass, pks):
+        related = self.RELATED_MODELS.get(modelClass._meta.label)
+        if related is None:
+            return super().fetch_model_instances(modelClass, pks)
+        return modelClass.objects.select_related(*related).in_bulk(pks)
+
+    def _fetch_objects(self, references):
+        objects = super()._fetch_objects(references)
+        users = list(objects.get(self.USER_MODEL, {}).values())
+
+        # point relations to the instances we already have.
+        for reference, related in self.RELATED_MODELS.items():
+            for instance in objects.get(reference, {}).values():
+                for field_name in related:
+                    field = instance._meta.get_field(field_name)
+                    loaded = objects.get(field.related_model._meta.label, {})
+                    shared = loaded.get(getattr(instance, field.attname))
+                    if shared is not None:
+                        setattr(instance, field_name, shared)
+                    elif field.related_model._meta.label == self.USER_MODEL:
+                        users.append(getattr(instance, field_name))
+
+        for user in users:
+            if user is None:
+                continue
+            for size in self.AVATAR_SIZES:
+                user.avatar_url(size)
+        return objects
+
 
 feed_manager = FeedManager()
@@ -3,6 +3,12 @@ ASGI config for upkoding project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Long-lived forum streams (`/forum/stream/...`, see `forum.realtime`) are served
+here without going through Django, everything else goes to the Django app.
+The site itself keeps running on WSGI, run the streams as a separate service
+(routing `/forum/stream/` to it) with:
+    gunicorn -k uvicorn.workers.UvicornWorker upkoding.asgi:application
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
@@ -13,4 +19,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'upkoding.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# needs apps to be loaded.
+from forum.realtime import stream_application  # noqa: E402
+
+STREAM_PATH_PREFIX = '/forum/stream/'
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(STREAM_PATH_PREFIX):
+        return await stream_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -1,12 +1,14 @@
 from django.http import HttpRequest
 from django.conf import settings
 from upkoding import pricing
+from upkoding.activity_feed import feed_manager
 
 
 def upkoding(request: HttpRequest):
     """
     Add custom values to context.
     """
+    user = getattr(request, "user", None)
     return {
         "app_version": settings.APP_VERSION,
         "domain": settings.SITE_DOMAIN,
@@ -16,4 +18,10 @@ def upkoding(request: HttpRequest):
         "show_roadmaps": settings.SHOW_ROADMAPS,
         "cannyio_enabled": settings.CANNYIO_ENABLED,
         "cannyio_url": settings.CANNYIO_URL,
+        # callable, only resolved (single cache read) when used in template.
+        "unread_notifications_count": lambda: (
+            feed_manager.get_unread_count(user.id)
+            if user and user.is_authenticated
+            else 0
+        ),
     }
@@ -0,0 +1,36 @@
+"""
+In-process background jobs.
+
+Used for work that doesn't need to block the response (eg. calling 3rd party APIs).
+Jobs run in a small thread pool inside the web worker, they are not persisted,
+so anything that must survive a restart need to be recoverable by other means.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections
+
+log = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        log.exception(f"Job {func.__module__}.{func.__name__} failed")
+        raise
+    finally:
+        close_old_connections()
+
+
+def defer(func, *args, **kwargs):
+    """
+    Run `func(*args, **kwargs)` in background, returns a `Future`.
+    Usage:
+        defer(send_email, user_id, subject="Hello")
+    """
+    return executor.submit(_run, func, args, kwargs)
@@ -7,3 +7,28 @@ class NewestIdLastCursorPagination(pagination.CursorPagination):
 
 class NewestIdFirstCursorPagination(pagination.CursorPagination):
     ordering = "-id"
+
+
+class SearchScoreCursorPagination(pagination.CursorPagination):
+    """
+    For querysets annotated with integer `score` (eg. `Thread.objects.search()`),
+    best match first.
+    """
+
+    ordering = ("-score", "-id")
+
+
+class SelectableOrderingCursorPagination(pagination.CursorPagination):
+    """
+    Ordering chosen by the client with `?ordering=<name>` among `orderings`,
+    eg. `orderings = {"newest": "-id", "active": ("-last_activity_at", "-id")}`.
+    Unknown names fall back to `ordering`.
+    """
+
+    orderings = {}
+    ordering_param = "ordering"
+
+    def get_ordering(self, request, queryset, view):
+        name = request.query_params.get(self.ordering_param)
+        ordering = self.orderings.get(name, self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
@@ -0,0 +1,31 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` encoding with orjson, several times faster than the stdlib `json`.
+    Output is the same: whatever orjson doesn't handle natively (and datetimes)
+    goes through DRF's encoder.
+    """
+
+    options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        renderer_context = renderer_context or {}
+        # rarely asked (eg. `Accept: application/json; indent=4`), leave it to DRF.
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        # same as DRF: U+2028/U+2029 are valid JSON but not valid javascript.
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 import os
 import yaml
 from pathlib import Path
+from urllib.parse import urlparse
 import dj_database_url
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
@@ -76,7 +77,8 @@ MIDDLEWARE = [
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "account.middleware.CachedAuthenticationMiddleware",
+    "account.middleware.EntitlementMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "upkoding.middlewares.TimezoneMiddleware",
@@ -127,6 +129,52 @@ DATABASES = {
     )
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# CACHE_URL:
+#   - locmem://                  (default) per process, fine for development and tests.
+#   - file:///var/tmp/upkoding   shared by workers of the same machine.
+#   - redis://redis:6379/0       shared by every worker and machine, use this in production
+#                                (stat buffer, throttles, user and session caches rely on it).
+#     Any Redis protocol server works (eg. the `redis` service of docker-compose locally).
+CACHE_URL = urlparse(os.getenv("CACHE_URL", "locmem://"))
+if CACHE_URL.scheme == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": CACHE_URL.geturl(),
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+                # cache is an optimization, don't fail requests when it's down.
+                "IGNORE_EXCEPTIONS": True,
+            },
+        }
+    }
+elif CACHE_URL.scheme == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CACHE_URL.path,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": CACHE_URL.netloc or "upkoding",
+        }
+    }
+CACHES["default"]["KEY_PREFIX"] = os.getenv("CACHE_KEY_PREFIX", "upkoding")
+
+# Sessions
+# SESSION_BACKEND:
+#   - cached_db       (default) read from the cache, written through to the database.
+#   - signed_cookies  no storage at all, session data lives in the (signed) cookie.
+#   - db              database only.
+SESSION_ENGINE = "django.contrib.sessions.backends.{}".format(
+    os.getenv("SESSION_BACKEND", "cached_db")
+)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -152,6 +200,17 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_PAGINATION_CLASS": "upkoding.pagination.NewestIdLastCursorPagination",
     "PAGE_SIZE": 10,
+    "DEFAULT_RENDERER_CLASSES": [
+        "upkoding.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # see upkoding/throttling.py
+    "DEFAULT_THROTTLE_RATES": {
+        "forum_thread": os.getenv("THROTTLE_RATE_FORUM_THREAD", "10/hour"),
+        "forum_reply": os.getenv("THROTTLE_RATE_FORUM_REPLY", "60/hour"),
+        "forum_thread_view": os.getenv("THROTTLE_RATE_FORUM_THREAD_VIEW", "60/min"),
+        "code_submission": os.getenv("THROTTLE_RATE_CODE_SUBMISSION", "20/min"),
+    },
 }
 
 # Internationalization
@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from upkoding import throttling
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'throttling-tests'}})
+class ThrottlingHitTest(SimpleTestCase):
+    limit = 10
+    period = 60
+
+    def setUp(self):
+        cache.clear()
+        self.now = 6000.0  # start of a window
+
+    def hit(self):
+        with mock.patch('upkoding.throttling.time.time', return_value=self.now):
+            return throttling.hit('test', 'ident', self.limit, self.period)
+
+    def test_allows_up_to_limit(self):
+        for _ in range(self.limit):
+            self.assertEqual(self.hit(), 0)
+        self.assertEqual(self.hit(), self.period)
+
+    def test_retry_after_is_enough_at_limit_boundary(self):
+        # previous window full, current window with a few requests.
+        for _ in range(self.limit):
+            self.hit()
+        self.now += self.period + 30
+        allowed = 0
+        while self.hit() == 0:
+            allowed += 1
+        # previous window still weights half of it.
+        self.assertEqual(allowed, self.limit // 2)
+
+        wait = self.hit()
+        self.assertGreater(wait, 0)
+        # retrying after `wait` succeeds, retrying a second earlier doesn't.
+        self.now += wait - 1
+        self.assertGreater(self.hit(), 0)
+        self.now += 1
+        self.assertEqual(self.hit(), 0)
+
+    def test_rejected_requests_are_not_counted(self):
+        for _ in range(self.limit + 5):
+            self.hit()
+        # previous window weights 80%: 8 + 1 requests allowed,
+        # it wouldn't be if it counted `limit + 5` requests.
+        self.now += self.period + 12
+        self.assertEqual(self.hit(), 0)
@@ -0,0 +1,163 @@
+"""
+Sliding window rate limits kept in the shared cache, for endpoints where every
+write is expensive (emails, stats, Judge0 runs).
+
+Rates are configured per scope in `REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]`
+(eg. `"forum_reply": "20/min"`) and used by both:
+    - `ScopedSlidingWindowThrottle`, DRF throttle for views with `throttle_scope`.
+    - `throttle(scope)`, decorator for regular Django views.
+
+Each scope/client pair has a counter per fixed window, requests are counted as
+`previous window * remaining share of it + current window`, which smooths bursts
+at window edges without storing every request timestamp.
+Rejected requests aren't counted, they get a `Retry-After` and are counted in
+`metrics()` instead.
+"""
+import logging
+import math
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+log = logging.getLogger(__name__)
+
+KEY_PREFIX = "throttle"
+METRIC_KEY_PREFIX = f"{KEY_PREFIX}:metrics:rejected"
+THROTTLED_MESSAGE = "Terlalu banyak permintaan, coba lagi dalam {} detik."
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+
+
+def get_rate(scope):
+    """
+    Returns `(limit, period in seconds)` configured for `scope`, `None` when unlimited.
+    """
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if rate is None:
+        return None
+    # same format as DRF rates, eg. "20/min"
+    limit, period = rate.split("/")
+    return int(limit), PERIODS[period[0]]
+
+
+def _incr(key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def hit(scope, ident, limit, period):
+    """
+    Count a request of `ident` in `scope`.
+    Returns `0` when allowed, otherwise seconds to wait before the next request is.
+    """
+    now = time.time()
+    window = int(now // period)
+    elapsed = now - window * period
+    key = f"{KEY_PREFIX}:{scope}:{ident}"
+    previous = cache.get(f"{key}:{window - 1}", 0)
+    # counted first, so concurrent requests can't all slip through.
+    # both windows are needed until the end of the next one.
+    current = _incr(f"{key}:{window}", period * 2)
+
+    weight = (period - elapsed) / period
+    if previous * weight + current <= limit:
+        return 0
+
+    # rejected requests aren't counted.
+    try:
+        current = cache.decr(f"{key}:{window}")
+    except ValueError:
+        current = 0
+
+    if current >= limit or not previous:
+        # full until the current window ends, at least.
+        wait = period - elapsed
+    else:
+        # until the previous window weight drops enough for one more request:
+        # previous * weight + current + 1 <= limit
+        wait = period * (1 - (limit - current - 1) / previous) - elapsed
+    _incr(f"{METRIC_KEY_PREFIX}:{scope}", None)
+    log.warning(f"Throttled {ident} in {scope} ({limit}/{period}s)")
+    return max(int(math.ceil(wait)), 1)
+
+
+def metrics(scopes=None):
+    """
+    Returns `{scope: rejected requests}`, of every configured scope by default.
+    """
+    scopes = scopes or list(api_settings.DEFAULT_THROTTLE_RATES)
+    values = cache.get_many([f"{METRIC_KEY_PREFIX}:{scope}" for scope in scopes])
+    return {scope: values.get(f"{METRIC_KEY_PREFIX}:{scope}", 0) for scope in scopes}
+
+
+def get_ident(request):
+    """
+    User id for authenticated users, client IP (as DRF sees it) otherwise.
+    """
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+class ScopedSlidingWindowThrottle(BaseThrottle):
+    """
+    Limits requests to views with `throttle_scope` to the rate of the scope.
+    Only `methods` are counted, so reads of a list/create view stay unlimited.
+    """
+
+    methods = ("POST",)
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, "throttle_scope", None)
+        rate = get_rate(scope) if scope else None
+        if rate is None or request.method not in self.methods:
+            return True
+
+        self.wait_seconds = hit(scope, get_ident(request), *rate)
+        return not self.wait_seconds
+
+    def wait(self):
+        # DRF turns it into the `Retry-After` header.
+        return self.wait_seconds
+
+
+def throttle(scope, methods=("POST",), condition=None):
+    """
+    Decorator limiting a Django view to the rate of `scope`.
+    Only `methods` requests (for which `condition(request)` is true, if given)
+    are counted. Rejected requests get a 429 with errors formatted like
+    `form.errors.as_json()`.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = get_rate(scope)
+            if (
+                rate is not None
+                and request.method in methods
+                and (condition is None or condition(request))
+            ):
+                wait = hit(scope, get_ident(request), *rate)
+                if wait:
+                    message = THROTTLED_MESSAGE.format(wait)
+                    response = JsonResponse(
+                        {"__all__": [{"message": message, "code": "throttled"}]},
+                        status=429,
+                    )
+                    response["Retry-After"] = str(wait)
+                    return response
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator